@@ -0,0 +1,38 @@
+"""add the refresh token snapshots
+
+Revision ID: 79823065574b
+Revises: 91e8de642bee
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# revision identifiers, used by Alembic.
+revision = '79823065574b'
+down_revision = '91e8de642bee'
+
+TABLE_NAME = 'auth_refresh_token'
+VERSION_TABLE_NAME = 'auth_snapshot_version'
+
+
+def upgrade():
+    op.add_column(TABLE_NAME, sa.Column('snapshot_version', sa.BigInteger))
+    op.add_column(TABLE_NAME, sa.Column('snapshot_metadata', sa.Text))
+    op.add_column(TABLE_NAME, sa.Column('snapshot_acls', ARRAY(sa.Text)))
+
+    version_table = op.create_table(
+        VERSION_TABLE_NAME,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('version', sa.BigInteger, nullable=False, server_default='0'),
+        sa.CheckConstraint('id = 1'),
+    )
+    op.bulk_insert(version_table, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table(VERSION_TABLE_NAME)
+    op.drop_column(TABLE_NAME, 'snapshot_acls')
+    op.drop_column(TABLE_NAME, 'snapshot_metadata')
+    op.drop_column(TABLE_NAME, 'snapshot_version')
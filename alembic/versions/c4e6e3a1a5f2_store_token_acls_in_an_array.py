@@ -0,0 +1,43 @@
+"""store token acls in an array
+
+Revision ID: c4e6e3a1a5f2
+Revises: 79823065574b
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# revision identifiers, used by Alembic.
+revision = 'c4e6e3a1a5f2'
+down_revision = '79823065574b'
+
+TABLE_NAME = 'auth_token'
+
+
+def upgrade():
+    op.add_column(
+        TABLE_NAME,
+        sa.Column(
+            'acls', ARRAY(sa.Text), nullable=False, server_default=sa.text("'{}'")
+        ),
+    )
+    op.execute(
+        '''
+        UPDATE auth_token
+        SET acls = auth_acl.values
+        FROM (
+            SELECT token_uuid, array_agg(value ORDER BY id) AS values
+            FROM auth_acl
+            GROUP BY token_uuid
+        ) AS auth_acl
+        WHERE auth_token.uuid = auth_acl.token_uuid
+        '''
+    )
+    # NOTE: auth_acl is kept, and still written, so that the previous version can run
+    # alongside this one during a rolling upgrade. It will be dropped in a later release.
+
+
+def downgrade():
+    op.drop_column(TABLE_NAME, 'acls')
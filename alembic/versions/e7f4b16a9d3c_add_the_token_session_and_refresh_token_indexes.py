@@ -0,0 +1,31 @@
+"""add the token, session and refresh token indexes
+
+Revision ID: e7f4b16a9d3c
+Revises: c4e6e3a1a5f2
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e7f4b16a9d3c'
+down_revision = 'c4e6e3a1a5f2'
+
+INDEXES = [
+    ('auth_acl__idx__token_uuid', 'auth_acl', ['token_uuid']),
+    ('auth_token__idx__auth_id', 'auth_token', ['auth_id']),
+    ('auth_token__idx__expire_t', 'auth_token', ['expire_t']),
+    ('auth_token__idx__session_uuid', 'auth_token', ['session_uuid']),
+    ('auth_session__idx__tenant_uuid', 'auth_session', ['tenant_uuid']),
+    ('auth_refresh_token__idx__user_uuid', 'auth_refresh_token', ['user_uuid']),
+]
+
+
+def upgrade():
+    for name, table_name, columns in INDEXES:
+        op.create_index(name, table_name, columns)
+
+
+def downgrade():
+    for name, table_name, _ in INDEXES:
+        op.drop_index(name, table_name=table_name)
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from hamcrest import (
+    all_of,
     assert_that,
     calling,
     contains,
@@ -10,13 +11,21 @@ from hamcrest import (
     equal_to,
     has_entries,
     has_key,
+    has_length,
+    has_items,
     has_properties,
 )
+from mock import Mock
 from xivo_test_helpers.mock import ANY_UUID
 from xivo_test_helpers.hamcrest.raises import raises
 
 from wazo_auth import exceptions
-from wazo_auth.database import models
+from wazo_auth.database import models, queries
+from wazo_auth.plugins.backends.wazo_user import WazoUser
+from wazo_auth.plugins.metadata.default_user import DefaultUser
+from wazo_auth.purpose import Purpose
+from wazo_auth.services import GroupService, UserService
+from wazo_auth.services.helpers import LoginContext, TenantTree
 from ..helpers import fixtures, base
 
 
@@ -162,6 +171,40 @@ class TestGroupDAO(base.DAOTestCase):
         expected = build_list_matcher('baz', 'foo')
         assert_that(result, contains(*expected))
 
+    @fixtures.db.group(name='foo')
+    @fixtures.db.group(name='bar')
+    @fixtures.db.user()
+    @fixtures.db.user()
+    def test_list_with_members(self, user1_uuid, user2_uuid, foo_uuid, bar_uuid):
+        assert_that(self._group_dao.list_with_members(user1_uuid), empty())
+
+        self._group_dao.add_user(foo_uuid, user1_uuid)
+        self._group_dao.add_user(foo_uuid, user2_uuid)
+        self._group_dao.add_user(bar_uuid, user2_uuid)
+
+        result = self._group_dao.list_with_members(user1_uuid)
+        assert_that(
+            result,
+            contains(
+                has_entries(
+                    uuid=foo_uuid,
+                    name='foo',
+                    users=contains_inanyorder(
+                        has_entries(uuid=user1_uuid), has_entries(uuid=user2_uuid)
+                    ),
+                )
+            ),
+        )
+
+        result = self._group_dao.list_with_members(user2_uuid)
+        assert_that(
+            result,
+            contains(
+                has_entries(name='bar', users=contains(has_entries(uuid=user2_uuid))),
+                has_entries(name='foo'),
+            ),
+        )
+
     @fixtures.db.group()
     @fixtures.db.policy()
     def test_remove_policy(self, policy_uuid, group_uuid):
@@ -195,3 +238,90 @@ class TestGroupDAO(base.DAOTestCase):
 
         nb_deleted = self._group_dao.remove_user(group_uuid, user_uuid)
         assert_that(nb_deleted, equal_to(1))
+
+
+class TestLoginContext(base.DAOTestCase):
+    @fixtures.db.user(username='alice')
+    @fixtures.db.user()
+    def test_statements_do_not_grow_with_groups(self, member_uuid, user_uuid):
+        dao = queries.DAO.from_defaults()
+        tenant_tree = TenantTree(self._tenant_dao)
+        tenant_tree.list_visible_tenants(self.top_tenant_uuid)
+
+        nb_statements = []
+        for i in range(1, 51):
+            group_uuid = self._group_dao.create(
+                name='login-context-{}'.format(i), tenant_uuid=self.top_tenant_uuid
+            )
+            self._group_dao.add_user(group_uuid, user_uuid)
+            self._group_dao.add_user(group_uuid, member_uuid)
+            if i not in (1, 10, 50):
+                continue
+
+            self.session.expire_all()
+            context = LoginContext(dao, tenant_tree, 'alice')
+            with self.count_statements() as statements:
+                context.user
+                context.groups
+                context.tenant
+
+            assert_that(context.groups, has_length(i))
+            nb_statements.append(len(statements))
+
+        assert_that(set(nb_statements), has_length(1))
+
+    @fixtures.db.policy(acl_templates=['user.policy.#'])
+    @fixtures.db.user(username='alice')
+    def test_login_statements_do_not_grow_with_groups(self, user_uuid, policy_uuid):
+        self._user_dao.add_policy(user_uuid, policy_uuid)
+        dao = queries.DAO.from_defaults()
+        tenant_tree = TenantTree(self._tenant_dao)
+        tenant_tree.list_visible_tenants(self.top_tenant_uuid)
+        # NOTE: the services have no ACL template cache
+        user_service = UserService(dao, tenant_tree)
+        group_service = GroupService(dao, tenant_tree)
+        default_user = DefaultUser()
+        default_user.load({'user_service': user_service, 'user_data_fetcher': Mock()})
+        backend = WazoUser()
+        backend.load(
+            {
+                'config': {},
+                'user_data_fetcher': Mock(),
+                'user_service': user_service,
+                'group_service': group_service,
+                'purposes': {'user': Purpose('user', [default_user])},
+            }
+        )
+
+        nb_statements = []
+        for i in range(1, 51):
+            group_uuid = self._group_dao.create(
+                name='login-{}'.format(i), tenant_uuid=self.top_tenant_uuid
+            )
+            group_policy_uuid = self._policy_dao.create(
+                name='login-{}'.format(i),
+                description='',
+                acl_templates=['group.{}.#'.format(i)],
+                tenant_uuid=self.top_tenant_uuid,
+            )
+            self._group_dao.add_policy(group_uuid, group_policy_uuid)
+            self._group_dao.add_user(group_uuid, user_uuid)
+            if i not in (1, 10, 50):
+                continue
+
+            self.session.expire_all()
+            args = {}
+            with self.count_statements() as statements:
+                args['metadata'] = backend.get_metadata('alice', args)
+                acls = backend.get_acls('alice', args)
+
+            assert_that(
+                acls,
+                all_of(
+                    has_length(i + 1),
+                    has_items('user.policy.#', 'group.1.#', 'group.{}.#'.format(i)),
+                ),
+            )
+            nb_statements.append(len(statements))
+
+        assert_that(set(nb_statements), has_length(1))
@@ -218,6 +218,38 @@ class TestPolicyDAO(base.DAOTestCase):
                     limit,
                 )
 
+    @fixtures.db.policy(acl_templates=['other.#'])
+    @fixtures.db.policy(acl_templates=['group.#', 'shared.#'])
+    @fixtures.db.policy(acl_templates=['user.#', 'shared.#'])
+    @fixtures.db.group()
+    @fixtures.db.user()
+    def test_list_acl_templates_of_user(
+        self, user_uuid, group_uuid, user_policy, group_policy, other_policy
+    ):
+        result = self._policy_dao.list_acl_templates_of_user(user_uuid)
+        assert_that(result, equal_to({'user': [], 'groups': []}))
+
+        self._user_dao.add_policy(user_uuid, user_policy)
+        self._group_dao.add_policy(group_uuid, group_policy)
+        self._group_dao.add_policy(group_uuid, other_policy)
+
+        result = self._policy_dao.list_acl_templates_of_user(user_uuid)
+        assert_that(
+            result,
+            has_entries(user=contains_inanyorder('user.#', 'shared.#'), groups=empty()),
+        )
+
+        self._group_dao.add_user(group_uuid, user_uuid)
+
+        result = self._policy_dao.list_acl_templates_of_user(user_uuid)
+        assert_that(
+            result,
+            has_entries(
+                user=contains_inanyorder('user.#', 'shared.#'),
+                groups=contains_inanyorder('group.#', 'shared.#', 'other.#'),
+            ),
+        )
+
     @fixtures.db.policy(name='c', description='The third foobar')
     @fixtures.db.policy(name='b', description='The second foobar')
     @fixtures.db.policy(name='a')
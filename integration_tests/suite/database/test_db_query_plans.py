@@ -0,0 +1,184 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import time
+
+from hamcrest import assert_that, empty, is_not
+from sqlalchemy import text
+
+from ..helpers import base
+
+N_TENANTS = 1000
+N_USERS = 5000
+N_TOKENS = 100000
+N_REFRESH_TOKENS = 50000
+N_EXPIRED_TOKENS = 10
+
+SEEDED_TABLES = ('auth_token', 'auth_session', 'auth_refresh_token')
+EXPLAINED_STATEMENTS = ('SELECT', 'DELETE', 'UPDATE')
+
+
+def _tenant_uuid(i):
+    return "md5('tenant-' || ({}))::uuid::text".format(i)
+
+
+def _user_uuid(i):
+    return "md5('user-' || ({}))::uuid::text".format(i)
+
+
+def _session_uuid(i):
+    return "md5('session-' || ({}))::uuid::text".format(i)
+
+
+SEED_QUERIES = [
+    '''
+    INSERT INTO auth_tenant (uuid, name, parent_uuid)
+    SELECT {uuid}, 'plan-tenant-' || i, :top_tenant_uuid
+    FROM generate_series(0, {n_tenants} - 1) AS i
+    '''.format(
+        uuid=_tenant_uuid('i'), n_tenants=N_TENANTS
+    ),
+    '''
+    INSERT INTO auth_user (uuid, username, purpose, enabled, tenant_uuid)
+    SELECT {uuid}, 'plan-user-' || i, 'user', true, {tenant_uuid}
+    FROM generate_series(0, {n_users} - 1) AS i
+    '''.format(
+        uuid=_user_uuid('i'),
+        tenant_uuid=_tenant_uuid('i % {}'.format(N_TENANTS)),
+        n_users=N_USERS,
+    ),
+    '''
+    INSERT INTO auth_session (uuid, tenant_uuid, mobile)
+    SELECT {uuid}, {tenant_uuid}, false
+    FROM generate_series(0, {n_tokens} - 1) AS i
+    '''.format(
+        uuid=_session_uuid('i'),
+        tenant_uuid=_tenant_uuid('i % {}'.format(N_TENANTS)),
+        n_tokens=N_TOKENS,
+    ),
+    '''
+    INSERT INTO auth_token (session_uuid, auth_id, issued_t, expire_t, metadata)
+    SELECT {session_uuid}, {auth_id}, :now, :now + i - {n_expired}, '{{}}'
+    FROM generate_series(0, {n_tokens} - 1) AS i
+    '''.format(
+        session_uuid=_session_uuid('i'),
+        auth_id=_user_uuid('i % {}'.format(N_USERS)),
+        n_expired=N_EXPIRED_TOKENS,
+        n_tokens=N_TOKENS,
+    ),
+    '''
+    INSERT INTO auth_refresh_token (client_id, user_uuid, backend, login, mobile)
+    SELECT 'plan-client-' || i, {user_uuid}, 'wazo_user', 'login', false
+    FROM generate_series(0, {n_refresh_tokens} - 1) AS i
+    '''.format(
+        user_uuid=_user_uuid('i % {}'.format(N_USERS)),
+        n_refresh_tokens=N_REFRESH_TOKENS,
+    ),
+    'ANALYZE auth_tenant, auth_user, auth_session, auth_token, auth_refresh_token',
+]
+
+
+class TestQueryPlans(base.DAOTestCase):
+    def setUp(self):
+        super().setUp()
+        for query in SEED_QUERIES:
+            self.session.execute(
+                text(query),
+                {'top_tenant_uuid': self.top_tenant_uuid, 'now': int(time.time())},
+            )
+
+        self.user_uuid = self._select_one('SELECT {}'.format(_user_uuid(42)))
+        self.tenant_uuid = self._select_one('SELECT {}'.format(_tenant_uuid(42)))
+        self.token_uuid = self._select_one(
+            'SELECT uuid FROM auth_token WHERE auth_id = :auth_id LIMIT 1',
+            auth_id=self.user_uuid,
+        )
+
+    def test_token_get(self):
+        self.assert_no_sequential_scan(self._token_dao.get, self.token_uuid)
+
+    def test_token_delete_expired_tokens_and_sessions(self):
+        self.assert_no_sequential_scan(
+            self._token_dao.delete_expired_tokens_and_sessions, limit=100
+        )
+
+    def test_token_get_tokens_and_session_that_expire_soon(self):
+        self.assert_no_sequential_scan(
+            self._token_dao.get_tokens_and_session_that_expire_soon, 60
+        )
+
+    def test_user_count_sessions(self):
+        self.assert_no_sequential_scan(self._user_dao.count_sessions, self.user_uuid)
+
+    def test_session_list_by_user(self):
+        self.assert_no_sequential_scan(
+            self._session_dao.list_, user_uuid=self.user_uuid
+        )
+
+    def test_session_list_by_tenant(self):
+        self.assert_no_sequential_scan(
+            self._session_dao.list_, tenant_uuids=[self.tenant_uuid]
+        )
+
+    def test_session_count_by_tenant(self):
+        self.assert_no_sequential_scan(
+            self._session_dao.count, tenant_uuids=[self.tenant_uuid]
+        )
+
+    def test_refresh_token_list_by_user(self):
+        self.assert_no_sequential_scan(
+            self._refresh_token_dao.list_,
+            user_uuid=self.user_uuid,
+            tenant_uuids=[self.tenant_uuid],
+        )
+
+    def test_refresh_token_count_by_user(self):
+        self.assert_no_sequential_scan(
+            self._refresh_token_dao.count,
+            user_uuid=self.user_uuid,
+            tenant_uuids=[self.tenant_uuid],
+        )
+
+    def assert_no_sequential_scan(self, query, *args, **kwargs):
+        with self.count_statements(with_parameters=True) as statements:
+            query(*args, **kwargs)
+
+        statements = [
+            (statement, parameters)
+            for statement, parameters in statements
+            if statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS)
+        ]
+        assert_that(statements, is_not(empty()))
+        for statement, parameters in statements:
+            plan = self.explain(statement, parameters)
+            scanned = [
+                node['Relation Name']
+                for node in _walk_plan(plan)
+                if node['Node Type'] == 'Seq Scan'
+            ]
+            seeded_scanned = [table for table in scanned if table in SEEDED_TABLES]
+            assert_that(
+                seeded_scanned,
+                empty(),
+                'sequential scan in\n{}\n{}'.format(
+                    statement, json.dumps(plan, indent=2)
+                ),
+            )
+
+    def explain(self, statement, parameters):
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+            return cursor.fetchone()[0][0]['Plan']
+        finally:
+            cursor.close()
+
+    def _select_one(self, query, **parameters):
+        return self.session.execute(text(query), parameters).scalar()
+
+
+def _walk_plan(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _walk_plan(child)
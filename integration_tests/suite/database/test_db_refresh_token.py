@@ -4,7 +4,14 @@
 import datetime
 import uuid
 
-from hamcrest import assert_that, contains_inanyorder, empty, equal_to, has_entries
+from hamcrest import (
+    assert_that,
+    contains_inanyorder,
+    empty,
+    equal_to,
+    has_entries,
+    none,
+)
 from ..helpers import fixtures, base
 
 ALICE_UUID = str(uuid.uuid4())
@@ -125,3 +132,31 @@ class TestRefreshTokenDAO(base.DAOTestCase):
 
         result = self._refresh_token_dao.list_(user_uuid=ALICE_UUID, search='foo')
         assert_that(result, contains_inanyorder(has_entries(uuid=token_3)))
+
+    @fixtures.db.user(uuid=ALICE_UUID, username='alice')
+    @fixtures.db.refresh_token(user_uuid=ALICE_UUID, client_id='foobar')
+    def test_snapshot(self, refresh_token, _):
+        result = self._refresh_token_dao.get(refresh_token, 'foobar')
+        assert_that(result, has_entries(snapshot=none()))
+
+        version = self._refresh_token_dao.get_snapshot_version()
+        metadata = {'uuid': ALICE_UUID, 'groups': []}
+        self._refresh_token_dao.update_snapshot(
+            refresh_token, version, metadata, ['foo.#', 'bar']
+        )
+
+        result = self._refresh_token_dao.get(refresh_token, 'foobar')
+        assert_that(
+            result,
+            has_entries(
+                login=None,
+                snapshot=has_entries(
+                    version=version, metadata=metadata, acls=['foo.#', 'bar']
+                ),
+            ),
+        )
+
+        self._refresh_token_dao.bump_snapshot_version()
+        assert_that(
+            self._refresh_token_dao.get_snapshot_version(), equal_to(version + 1)
+        )
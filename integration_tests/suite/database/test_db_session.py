@@ -11,6 +11,7 @@ from hamcrest import (
     empty,
     has_entries,
 )
+from wazo_auth.database import models
 from ..helpers import base, fixtures
 
 TENANT_UUID_1 = str(uuid.uuid4())
@@ -74,3 +75,34 @@ class TestSessionDAO(base.DAOTestCase):
 
         result = self._session_dao.count(tenant_uuids=[])
         assert_that(result, equal_to(0))
+
+    @fixtures.db.token()
+    def test_delete(self, token):
+        other_token = models.Token(
+            auth_id=token['auth_id'], session_uuid=token['session_uuid']
+        )
+        self.session.add(other_token)
+        self.session.flush()
+
+        session, tokens = self._session_dao.delete(
+            token['session_uuid'], [self.top_tenant_uuid]
+        )
+
+        assert_that(
+            session,
+            has_entries(uuid=token['session_uuid'], tenant_uuid=self.top_tenant_uuid),
+        )
+        assert_that(
+            tokens,
+            contains_inanyorder(
+                has_entries(uuid=token['uuid'], auth_id=token['auth_id']),
+                has_entries(uuid=other_token.uuid, auth_id=token['auth_id']),
+            ),
+        )
+        assert_that(self._session_dao.list_(), empty())
+
+    @fixtures.db.token()
+    def test_delete_not_visible(self, token):
+        result = self._session_dao.delete(token['session_uuid'], [str(uuid.uuid4())])
+
+        assert_that(result, equal_to(({}, [])))
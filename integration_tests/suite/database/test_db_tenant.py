@@ -20,8 +20,9 @@ from hamcrest import (
 from xivo_test_helpers.mock import ANY_UUID
 from wazo_auth import exceptions
 from wazo_auth.database import models
+from wazo_auth.database.queries.tenant import TenantDAO
 
-from ..helpers import fixtures, base, constants
+from ..helpers import fixtures, base
 
 TENANT_UUID = '00000000-0000-4000-9000-000000000000'
 USER_UUID = '00000000-0000-4000-9000-111111111111'
@@ -29,83 +30,6 @@ ADDRESS_ID = 42
 
 
 class TestTenantDAO(base.DAOTestCase):
-    def test_tenant_segregation(self):
-        # This test will use the following tenant scructure
-        #         top
-        #       /  |  \
-        #      a   e   h
-        #     / \  |
-        #    d  b  f
-        #       /\
-        #      g  c
-
-        top_uuid = self._top_tenant_uuid()
-        a_uuid = self._create_tenant(name='a', parent_uuid=top_uuid)
-        e_uuid = self._create_tenant(name='e', parent_uuid=top_uuid)
-        h_uuid = self._create_tenant(name='h', parent_uuid=top_uuid)
-        d_uuid = self._create_tenant(name='d', parent_uuid=a_uuid)
-        b_uuid = self._create_tenant(name='b', parent_uuid=a_uuid)
-        f_uuid = self._create_tenant(name='f', parent_uuid=e_uuid)
-        g_uuid = self._create_tenant(name='g', parent_uuid=b_uuid)
-        c_uuid = self._create_tenant(name='c', parent_uuid=b_uuid)
-
-        # No scoping tenant returns all tenants
-        result = self._tenant_dao.list_visible_tenants()
-        assert_that(
-            result,
-            contains_inanyorder(
-                has_properties(uuid=top_uuid),
-                has_properties(uuid=a_uuid),
-                has_properties(uuid=b_uuid),
-                has_properties(uuid=c_uuid),
-                has_properties(uuid=d_uuid),
-                has_properties(uuid=e_uuid),
-                has_properties(uuid=f_uuid),
-                has_properties(uuid=g_uuid),
-                has_properties(uuid=h_uuid),
-            ),
-        )
-
-        # Top tenant sees everyone
-        result = self._tenant_dao.list_visible_tenants(scoping_tenant_uuid=top_uuid)
-        assert_that(
-            result,
-            contains_inanyorder(
-                has_properties(uuid=top_uuid),
-                has_properties(uuid=a_uuid),
-                has_properties(uuid=b_uuid),
-                has_properties(uuid=c_uuid),
-                has_properties(uuid=d_uuid),
-                has_properties(uuid=e_uuid),
-                has_properties(uuid=f_uuid),
-                has_properties(uuid=g_uuid),
-                has_properties(uuid=h_uuid),
-            ),
-        )
-
-        # Leaves can see themselves only
-        result = self._tenant_dao.list_visible_tenants(scoping_tenant_uuid=c_uuid)
-        assert_that(result, contains(has_properties(uuid=c_uuid)))
-
-        # An unknown tenant returns nothing
-        result = self._tenant_dao.list_visible_tenants(
-            scoping_tenant_uuid=constants.UNKNOWN_UUID
-        )
-        assert_that(result, empty())
-
-        # A tenant sees all of its subtenant and itself
-        result = self._tenant_dao.list_visible_tenants(scoping_tenant_uuid=a_uuid)
-        assert_that(
-            result,
-            contains_inanyorder(
-                has_properties(uuid=a_uuid),
-                has_properties(uuid=b_uuid),
-                has_properties(uuid=c_uuid),
-                has_properties(uuid=d_uuid),
-                has_properties(uuid=g_uuid),
-            ),
-        )
-
     @fixtures.db.tenant(name='c')
     @fixtures.db.tenant(name='b')
     @fixtures.db.tenant(name='a')
@@ -193,6 +117,18 @@ class TestTenantDAO(base.DAOTestCase):
             raises(exceptions.MasterTenantConflictException),
         )
 
+    def test_find_top_tenant(self):
+        top_tenant_uuid = self._top_tenant_uuid()
+
+        self._tenant_dao.reset_top_tenant()
+        assert_that(self._tenant_dao.find_top_tenant(), equal_to(top_tenant_uuid))
+
+        # The top tenant is memoized for the whole process
+        with self.count_statements() as statements:
+            result = TenantDAO().find_top_tenant()
+        assert_that(result, equal_to(top_tenant_uuid))
+        assert_that(statements, empty())
+
     @fixtures.db.tenant()
     def test_delete(self, tenant_uuid):
         self._tenant_dao.delete(tenant_uuid)
@@ -7,9 +7,13 @@ import uuid
 from hamcrest import (
     all_of,
     assert_that,
+    contains,
+    contains_inanyorder,
+    empty,
     equal_to,
     has_entries,
     has_items,
+    has_length,
     has_properties,
     not_,
 )
@@ -19,6 +23,7 @@ from wazo_auth.database import models
 from ..helpers import base, fixtures
 
 SESSION_UUID_1 = str(uuid.uuid4())
+TENANT_UUID = str(uuid.uuid4())
 
 
 class TestTokenDAO(base.DAOTestCase):
@@ -40,12 +45,37 @@ class TestTokenDAO(base.DAOTestCase):
             'remote_addr': '192.168.1.1',
         }
         session = {}
-        token_uuid, session_uuid = self._token_dao.create(body, session)
+        with self.count_statements() as statements:
+            token_uuid, session_uuid = self._token_dao.create(body, session)
+
+        assert_that(statements, has_length(3))
 
         result = self._token_dao.get(token_uuid)
         assert_that(
             result, has_entries(uuid=token_uuid, session_uuid=session_uuid, **body)
         )
+        legacy_acls = (
+            self.session.query(models.ACL.value)
+            .filter(models.ACL.token_uuid == token_uuid)
+            .order_by(models.ACL.id_)
+            .all()
+        )
+        assert_that([acl.value for acl in legacy_acls], contains('first', 'second'))
+
+    @fixtures.db.token()
+    def test_get_acls_written_by_the_previous_version(self, token):
+        self.session.execute(
+            models.ACL.__table__.insert().values(
+                [
+                    {'token_uuid': token['uuid'], 'value': 'first'},
+                    {'token_uuid': token['uuid'], 'value': 'second'},
+                ]
+            )
+        )
+
+        result = self._token_dao.get(token['uuid'])
+
+        assert_that(result, has_entries(acls=contains('first', 'second')))
 
     @fixtures.db.token()
     @fixtures.db.token()
@@ -57,6 +87,18 @@ class TestTokenDAO(base.DAOTestCase):
         result = self._token_dao.get(token['uuid'])
         assert_that(result, equal_to(token))
 
+    @fixtures.db.token(acls=['first', 'second'])
+    @fixtures.db.token()
+    @fixtures.db.token()
+    def test_get_many(self, token_1, token_2, token_3):
+        result = self._token_dao.get_many(
+            [token_1['uuid'], token_2['uuid'], self.unknown_uuid]
+        )
+        assert_that(result, contains_inanyorder(token_1, token_2))
+
+        result = self._token_dao.get_many([])
+        assert_that(result, empty())
+
     @fixtures.db.token()
     def test_delete(self, token):
         self._token_dao.delete(token['uuid'])
@@ -111,3 +153,143 @@ class TestTokenDAO(base.DAOTestCase):
                 not_(has_items(has_properties(uuid=token_3['uuid']))),
             ),
         )
+
+    @fixtures.db.token(expiration=0)
+    @fixtures.db.token(expiration=0)
+    @fixtures.db.token(expiration=0)
+    def test_delete_expired_tokens_and_sessions_by_batch(self, *tokens):
+        token_uuids = [token['uuid'] for token in tokens]
+
+        first_tokens, _ = self._token_dao.delete_expired_tokens_and_sessions(limit=2)
+        second_tokens, _ = self._token_dao.delete_expired_tokens_and_sessions(limit=2)
+        third_tokens, _ = self._token_dao.delete_expired_tokens_and_sessions(limit=2)
+
+        assert_that(first_tokens, has_length(2))
+        assert_that(second_tokens, has_length(1))
+        assert_that(third_tokens, empty())
+        assert_that(
+            [token['uuid'] for token in first_tokens + second_tokens],
+            contains_inanyorder(*token_uuids),
+        )
+
+    @fixtures.db.token(expiration=0)
+    def test_delete_expired_tokens_and_sessions_keeps_used_sessions(self, token):
+        session = {'uuid': token['session_uuid']}
+        self.session.add(
+            models.Token(
+                auth_id='foo',
+                session_uuid=token['session_uuid'],
+                expire_t=int(time.time()) + 120,
+            )
+        )
+        self.session.flush()
+
+        tokens, sessions = self._token_dao.delete_expired_tokens_and_sessions()
+
+        assert_that(tokens, contains(has_entries(uuid=token['uuid'])))
+        assert_that(sessions, not_(has_items(session)))
+
+    @fixtures.db.token()
+    @fixtures.db.token()
+    @fixtures.db.token()
+    def test_delete_orphan_sessions(self, token_1, token_2, token_3):
+        orphan_uuids = [token_1['session_uuid'], token_2['session_uuid']]
+        self.session.query(models.Token).filter(
+            models.Token.uuid.in_([token_1['uuid'], token_2['uuid']])
+        ).delete(synchronize_session=False)
+
+        first_sessions = self._token_dao.delete_orphan_sessions(limit=1)
+        other_sessions = self._token_dao.delete_orphan_sessions()
+
+        assert_that(first_sessions, has_length(1))
+        assert_that(
+            first_sessions + other_sessions,
+            all_of(
+                has_items(
+                    *[
+                        has_entries(uuid=uuid, tenant_uuid=self.top_tenant_uuid)
+                        for uuid in orphan_uuids
+                    ]
+                ),
+                not_(has_items(has_entries(uuid=token_3['session_uuid']))),
+            ),
+        )
+        remaining = self.session.query(models.Session.uuid).filter(
+            models.Session.uuid.in_(orphan_uuids)
+        )
+        assert_that(remaining.all(), empty())
+
+    @fixtures.db.token(expiration=30, metadata={'tenant_uuid': TENANT_UUID})
+    @fixtures.db.token(expiration=3600)
+    def test_get_tokens_and_session_that_expire_soon(self, token_1, token_2):
+        with self.count_statements() as statements:
+            tokens, sessions = self._token_dao.get_tokens_and_session_that_expire_soon(
+                60
+            )
+
+        assert_that(statements, has_length(1))
+        assert_that(
+            tokens,
+            contains(
+                has_entries(
+                    uuid=token_2['uuid'],
+                    auth_id=token_2['auth_id'],
+                    session_uuid=token_2['session_uuid'],
+                    tenant_uuid=TENANT_UUID,
+                )
+            ),
+        )
+        assert_that(sessions, contains(has_entries(uuid=token_2['session_uuid'])))
+
+
+class TestTokenDAOStatements(base.DAOTestCase):
+    # NOTE: regression tests on the number of statements, they do not measure latency
+    @fixtures.db.token(acls=['acl.{}'.format(i) for i in range(10)])
+    def test_get_10_acls(self, token):
+        self._assert_get_statements(token)
+
+    @fixtures.db.token(acls=['acl.{}'.format(i) for i in range(100)])
+    def test_get_100_acls(self, token):
+        self._assert_get_statements(token)
+
+    @fixtures.db.token(acls=['acl.{}'.format(i) for i in range(1000)])
+    def test_get_1000_acls(self, token):
+        self._assert_get_statements(token)
+
+    def test_create_10_acls(self):
+        self._assert_create_statements(10)
+
+    def test_create_100_acls(self):
+        self._assert_create_statements(100)
+
+    def test_create_1000_acls(self):
+        self._assert_create_statements(1000)
+
+    def _assert_create_statements(self, acl_count):
+        now = int(time.time())
+        body = {
+            'auth_id': 'statements',
+            'pbx_user_uuid': str(uuid.uuid4()),
+            'xivo_uuid': str(uuid.uuid4()),
+            'issued_t': now,
+            'expire_t': now + 120,
+            'acls': ['acl.{}'.format(i) for i in range(acl_count)],
+            'metadata': {},
+            'user_agent': '',
+            'remote_addr': '',
+        }
+
+        with self.count_statements() as statements:
+            token_uuid, _ = self._token_dao.create(body, {})
+
+        acls = self._token_dao.get(token_uuid)['acls']
+        assert_that(acls, contains_inanyorder(*body['acls']))
+        assert_that(statements, has_length(3))
+
+    def _assert_get_statements(self, token):
+        self.session.expire_all()
+        with self.count_statements() as statements:
+            acls = self._token_dao.get(token['uuid'])['acls']
+
+        assert_that(acls, contains_inanyorder(*token['acls']))
+        assert_that(statements, has_length(1))
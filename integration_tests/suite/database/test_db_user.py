@@ -11,6 +11,7 @@ from hamcrest import (
     empty,
     equal_to,
     has_entries,
+    has_length,
     has_properties,
     none,
     not_,
@@ -600,22 +601,53 @@ class TestUserDAO(base.DAOTestCase):
         result = self.session.query(models.UserExternalAuth).get((user_uuid, type_uuid))
         assert_that(result, equal_to(None))
 
-    @fixtures.db.user(username='foobar')
+    @fixtures.db.user(username='foobar', purpose='internal')
     @fixtures.db.user(username='foobaz', enabled=False)
-    def test_get_credential(self, *ignored_uuids):
+    def test_get_login_credentials(self, _, user_uuid):
         assert_that(
-            calling(self._user_dao.get_credentials).with_args('not-foobar'),
+            calling(self._user_dao.get_login_credentials).with_args('not-foobar'),
             raises(exceptions.UnknownUsernameException),
         )
 
         assert_that(
-            calling(self._user_dao.get_credentials).with_args('foobaz'),
+            calling(self._user_dao.get_login_credentials).with_args('foobaz'),
             raises(exceptions.UnknownUsernameException),
         )
 
-        hash_, salt = self._user_dao.get_credentials('foobar')
-        assert_that(hash_, not_(none()))
-        assert_that(salt, not_(none()))
+        result = self._user_dao.get_login_credentials('foobar')
+        assert_that(
+            result,
+            has_entries(
+                uuid=user_uuid,
+                purpose='internal',
+                password_hash=not_(none()),
+                password_salt=not_(none()),
+            ),
+        )
+
+    @fixtures.db.user(username='foobar', purpose='internal')
+    @fixtures.db.user(username='foobaz', enabled=False)
+    def test_get_by_username(self, disabled_uuid, user_uuid):
+        assert_that(
+            calling(self._user_dao.get_by_username).with_args('unknown'),
+            raises(exceptions.UnknownUsernameException),
+        )
+
+        with self.count_statements() as statements:
+            result = self._user_dao.get_by_username('foobar')
+        assert_that(
+            result,
+            has_entries(
+                uuid=user_uuid,
+                purpose='internal',
+                tenant_uuid=self.top_tenant_uuid,
+                enabled=True,
+            ),
+        )
+        assert_that(statements, has_length(1))
+
+        result = self._user_dao.get_by_username('foobaz')
+        assert_that(result, has_entries(uuid=disabled_uuid, enabled=False))
 
     def _email_exists(self, address):
         filter_ = models.Email.address == address
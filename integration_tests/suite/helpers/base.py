@@ -19,6 +19,7 @@ from hamcrest import (
     has_properties,
     equal_to,
 )
+from sqlalchemy import event
 from wazo_auth_client import Client
 from xivo_test_helpers import until
 from xivo_test_helpers.hamcrest.raises import raises
@@ -118,6 +119,23 @@ class DAOTestCase(unittest.TestCase):
     def session(self):
         return helpers.get_db_session()
 
+    @contextmanager
+    def count_statements(self, with_parameters=False):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, *args):
+            if with_parameters:
+                statements.append((statement, parameters))
+            else:
+                statements.append(statement)
+
+        engine = self.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
 
 class AuthLaunchingTestCase(AssetLaunchingTestCase):
 
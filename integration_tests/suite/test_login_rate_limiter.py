@@ -0,0 +1,34 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import requests
+
+from hamcrest import assert_that, has_entries, has_key
+
+from .helpers import base, fixtures
+
+
+class TestLoginRateLimiter(base.WazoAuthTestCase):
+
+    asset = 'login_rate_limiter'
+
+    @fixtures.http.user(username='limited', password='s3cr37')
+    def test_too_many_login_attempts(self, user):
+        for _ in range(3):
+            self._post_token_with_expected_exception(
+                'limited', 'wrong', status_code=401
+            )
+
+        self._post_token_with_expected_exception('limited', 's3cr37', status_code=429)
+
+        token = self._post_token(self.username, self.password)
+        assert_that(token, has_key('token'))
+
+        url = 'http://{}:{}/0.1/status'.format(self.auth_host, self.auth_port)
+        response = requests.get(url, headers={'X-Auth-Token': self.admin_token})
+        assert_that(
+            response.json(),
+            has_entries(
+                login_rate_limiter=has_entries(status='ok', rejected_by_login=1)
+            ),
+        )
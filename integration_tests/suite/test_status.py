@@ -1,6 +1,9 @@
 # Copyright 2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import requests
+
+from hamcrest import assert_that, equal_to, has_entries
 from xivo_test_helpers import until
 
 from .helpers.base import WazoAuthTestCase
@@ -15,3 +18,30 @@ class TestStatusAllOK(WazoAuthTestCase):
             self.client.status.check()
 
         until.assert_(status_ok, timeout=5)
+
+    def test_get_status(self):
+        url = 'http://{}:{}/0.1/status'.format(self.auth_host, self.auth_port)
+
+        response = requests.get(url)
+        assert_that(response.status_code, equal_to(401))
+
+        response = requests.get(url, headers={'X-Auth-Token': self.admin_token})
+        assert_that(response.status_code, equal_to(200))
+        assert_that(
+            response.json(),
+            has_entries(
+                rest_api=has_entries(status='ok'),
+                password_hashing=has_entries(status='ok', rejected=0),
+            ),
+        )
+
+    def test_get_status_leader_election(self):
+        url = 'http://{}:{}/0.1/status'.format(self.auth_host, self.auth_port)
+
+        def is_leader():
+            response = requests.get(url, headers={'X-Auth-Token': self.admin_token})
+            status = response.json()['leader_election']
+            assert_that(status, has_entries(status='ok', is_leader=True))
+            assert_that(status['leader'], equal_to(status['name']))
+
+        until.assert_(is_leader, timeout=5)
@@ -0,0 +1,53 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import requests
+
+from hamcrest import assert_that, contains, equal_to, has_entries
+
+from .helpers.base import WazoAuthTestCase
+from .helpers.constants import UNKNOWN_UUID
+
+
+class TestTokenCheck(WazoAuthTestCase):
+    def test_check_many_tokens(self):
+        top_tenant_uuid = self.top_tenant_uuid
+        with self.client_in_subtenant() as (_, user, sub_tenant):
+            sub_client = self.new_auth_client(user['username'], 'secre7')
+            sub_token = sub_client.token.new(expiration=60)['token']
+            items = [
+                {'token': self.admin_token},
+                {'token': self.admin_token, 'tenant': sub_tenant['uuid']},
+                {'token': sub_token, 'scope': 'auth.users.read'},
+                {'token': sub_token, 'scope': 'confd.users.read'},
+                {'token': sub_token, 'tenant': sub_tenant['uuid']},
+                {'token': sub_token, 'tenant': top_tenant_uuid},
+                {'token': UNKNOWN_UUID},
+            ]
+
+            response = self._post_check(items)
+
+        assert_that(response.status_code, equal_to(200))
+        assert_that(
+            response.json(),
+            has_entries(
+                items=contains(
+                    has_entries(token=self.admin_token, valid=True),
+                    has_entries(tenant=sub_tenant['uuid'], valid=True),
+                    has_entries(scope='auth.users.read', valid=True),
+                    has_entries(scope='confd.users.read', valid=False),
+                    has_entries(token=sub_token, tenant=sub_tenant['uuid'], valid=True),
+                    has_entries(token=sub_token, tenant=top_tenant_uuid, valid=False),
+                    has_entries(token=UNKNOWN_UUID, valid=False),
+                )
+            ),
+        )
+
+    def test_check_invalid_body(self):
+        response = self._post_check([{'scope': 'auth.users.read'}])
+
+        assert_that(response.status_code, equal_to(400))
+
+    def _post_check(self, items):
+        url = 'http://{}:{}/0.1/token/check'.format(self.auth_host, self.auth_port)
+        return requests.post(url, json={'items': items})
@@ -0,0 +1,63 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_size, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expire_at = self._entries[key]
+            except KeyError:
+                return default
+
+            if expire_at is not None and time.time() >= expire_at:
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expire_at=None):
+        if self._max_size <= 0:
+            return
+
+        if self._ttl is not None:
+            ttl_expire_at = time.time() + self._ttl
+            if expire_at is None or ttl_expire_at < expire_at:
+                expire_at = ttl_expire_at
+
+        if expire_at is not None and time.time() >= expire_at:
+            return
+
+        with self._lock:
+            self._entries[key] = value, expire_at
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value, _ = self._entries.pop(key, (default, None))
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['max_size'], ttl=config.get('ttl'))
@@ -0,0 +1,115 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from wazo_confd_client import Client as ConfdClient
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10
+
+
+class UserDataFetcher:
+    def __init__(self, config, cache=None, pool_size=DEFAULT_POOL_SIZE):
+        confd_config = config['confd']
+        self._config = config
+        self._cache = cache if cache is not None else LRUCache(0)
+        # NOTE: the client is only used to build the URLs, its commands would create a
+        # new session, and a new connection, for each request
+        self._client = ConfdClient(**confd_config)
+        self._verify = confd_config.get('verify_certificate', True)
+        self._timeout = confd_config.get('timeout', DEFAULT_TIMEOUT)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def get_user_data(self, user_uuid):
+        if not user_uuid:
+            return {}
+
+        user_data = self._cache.get(user_uuid)
+        if user_data is not None:
+            return dict(user_data)
+
+        local_token_renewer = self._config.get('local_token_renewer')
+        if not local_token_renewer:
+            logger.info('no local token renewer')
+            return {}
+
+        token = local_token_renewer.get_token()
+        if not token:
+            logger.info('cannot create local token')
+            return {}
+
+        try:
+            user = self._get_user(user_uuid, token)
+        except requests.HTTPError:
+            return {}
+        except requests.RequestException as e:
+            logger.info('failed to fetch user %s from wazo-confd: %s', user_uuid, e)
+            return {}
+
+        user_data = _extract_user_data(user)
+        self._cache.set(user_uuid, user_data)
+        return dict(user_data)
+
+    def close(self):
+        self._session.close()
+
+    def _get_user(self, user_uuid, token):
+        headers = {'Accept': 'application/json', 'X-Auth-Token': token}
+        response = self._session.get(
+            self._client.url('users', user_uuid),
+            headers=headers,
+            verify=self._verify,
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config,
+            cache=LRUCache.from_config(config['user_data_cache']),
+            pool_size=config['rest_api']['max_threads'],
+        )
+
+
+def _extract_user_data(user):
+    voicemail = user.get('voicemail')
+    voicemails = [voicemail['id']] if voicemail else []
+    lines, sip, sccp, custom, extensions = [], [], [], [], []
+    for line in user['lines']:
+        lines.append(line['id'])
+        endpoint_custom = line.get('endpoint_custom')
+        endpoint_sip = line.get('endpoint_sip')
+        endpoint_sccp = line.get('endpoint_sccp')
+        if endpoint_custom:
+            custom.append(endpoint_custom['id'])
+        elif endpoint_sip:
+            sip.append(endpoint_sip['id'])
+        elif endpoint_sccp:
+            sccp.append(endpoint_sccp['id'])
+        for extension in line['extensions']:
+            extensions.append(extension['id'])
+    return {
+        'id': user['id'],
+        'uuid': user['uuid'],
+        'tenant_uuid': user['tenant_uuid'],
+        'voicemails': voicemails,
+        'lines': lines,
+        'extensions': extensions,
+        'endpoint_sip': sip,
+        'endpoint_sccp': sccp,
+        'endpoint_custom': custom,
+        'agent': user['agent'],
+    }
@@ -18,6 +18,37 @@ _DEFAULT_CONFIG = {
     'log_filename': '/var/log/wazo-auth.log',
     'default_token_lifetime': TWO_HOURS,
     'token_cleanup_interval': 60.0,
+    'token_cleanup_batch_size': 5000,
+    'token_cleanup_max_duration': 30.0,
+    'token_expiry_timer_wheel': {
+        'enabled': False,
+        'resolution': 1.0,
+        'slots': 64,
+        'levels': 4,
+        'reconciliation_interval': 3600.0,
+    },
+    'token_cleanup_leader_election': {
+        'enabled': True,
+        'lock_id': 1851947110,
+        'name': None,
+    },
+    'refresh_token_snapshot': False,
+    'token_cache': {'max_size': 10000, 'ttl': 5},
+    'tenant_tree': {'ttl': 60},
+    'acl_template_cache': {'max_size': 10000, 'ttl': 10},
+    'user_data_cache': {'max_size': 10000, 'ttl': 60},
+    'user_cache': {'max_size': 10000, 'ttl': 10},
+    'password_hashing': {
+        'max_workers': 4,
+        'max_queue_size': 8,
+        'iterations': {'user': 250000, 'internal': 250000, 'external_api': 250000},
+    },
+    'login_rate_limiter': {
+        'enabled': False,
+        'max_keys': 100000,
+        'source': {'burst': 60, 'period': 60},
+        'login': {'burst': 10, 'period': 60},
+    },
     'password_reset_expiration': 172800,
     'password_reset_from_name': 'wazo-auth',
     'password_reset_from_address': 'noreply@wazo.community',
@@ -12,13 +12,18 @@ from xivo.consul_helpers import ServiceCatalogRegistration
 from xivo.status import StatusAggregator
 
 from . import bus, services, token
+from .cache import LRUCache
+from .confd import UserDataFetcher
 from .database import queries
-from .database.helpers import init_db
+from .database.helpers import commit_or_rollback, init_db
 from .flask_helpers import Tenant
 from .helpers import LocalTokenRenewer
 from .http_server import api, CoreRestApi
+from .leader_election import AdvisoryLockLeaderElection
 from .purpose import Purposes
+from .rate_limiter import LoginRateLimiter
 from .service_discovery import self_check
+from .timer_wheel import TimerWheel
 
 logger = logging.getLogger(__name__)
 
@@ -50,12 +55,34 @@ class Controller:
         ]
 
         self.status_aggregator = StatusAggregator()
+        self._password_hashing_executor = services.PasswordHashingExecutor.from_config(
+            config
+        )
+        self.status_aggregator.add_provider(
+            self._password_hashing_executor.provide_status
+        )
+        login_rate_limiter = LoginRateLimiter.from_config(config['login_rate_limiter'])
+        self.status_aggregator.add_provider(login_rate_limiter.provide_status)
         template_formatter = services.helpers.TemplateFormatter(config)
         self._bus_publisher = bus.BusPublisher(config)
         dao = queries.DAO.from_defaults()
-        self._tenant_tree = services.helpers.TenantTree(dao.tenant)
+        self._dao = dao
+        token_cache = LRUCache.from_config(config['token_cache'])
+        timer_wheel = None
+        if config['token_expiry_timer_wheel']['enabled']:
+            timer_wheel = TimerWheel.from_config(config['token_expiry_timer_wheel'])
+        acl_template_cache = LRUCache.from_config(config['acl_template_cache'])
+        self._user_data_fetcher = UserDataFetcher.from_config(config)
+        self._tenant_tree = services.helpers.TenantTree(
+            dao.tenant, config['tenant_tree']['ttl']
+        )
         self._token_service = services.TokenService(
-            config, dao, self._tenant_tree, self._bus_publisher
+            config,
+            dao,
+            self._tenant_tree,
+            self._bus_publisher,
+            token_cache,
+            timer_wheel=timer_wheel,
         )
         self._backends = BackendsProxy()
         authentication_service = services.AuthenticationService(dao, self._backends)
@@ -74,14 +101,40 @@ class Controller:
             self._bus_publisher,
             enabled_external_auth_plugins,
         )
-        group_service = services.GroupService(dao, self._tenant_tree)
-        policy_service = services.PolicyService(dao, self._tenant_tree)
+        refresh_token_snapshot = config['refresh_token_snapshot']
+        group_service = services.GroupService(
+            dao,
+            self._tenant_tree,
+            acl_template_cache,
+            refresh_token_snapshot=refresh_token_snapshot,
+        )
+        policy_service = services.PolicyService(
+            dao,
+            self._tenant_tree,
+            acl_template_cache,
+            refresh_token_snapshot=refresh_token_snapshot,
+        )
         session_service = services.SessionService(
-            dao, self._tenant_tree, self._bus_publisher
+            dao, self._tenant_tree, self._bus_publisher, token_cache
+        )
+        self._user_service = services.UserService(
+            dao,
+            self._tenant_tree,
+            encrypter=services.PasswordEncrypter(
+                self._password_hashing_executor,
+                config['password_hashing']['iterations'],
+            ),
+            acl_template_cache=acl_template_cache,
+            user_cache=LRUCache.from_config(config['user_cache']),
+            refresh_token_snapshot=refresh_token_snapshot,
         )
-        self._user_service = services.UserService(dao, self._tenant_tree)
         self._tenant_service = services.TenantService(
-            dao, self._tenant_tree, self._bus_publisher
+            dao,
+            self._tenant_tree,
+            self._bus_publisher,
+            token_cache,
+            acl_template_cache,
+            refresh_token_snapshot=refresh_token_snapshot,
         )
 
         self._metadata_plugins = plugin_helpers.load(
@@ -94,6 +147,7 @@ class Controller:
                 'token_service': self._token_service,
                 'backends': self._backends,
                 'config': config,
+                'user_data_fetcher': self._user_data_fetcher,
             },
         )
 
@@ -110,6 +164,7 @@ class Controller:
                 'tenant_service': self._tenant_service,
                 'purposes': self._purposes,
                 'config': config,
+                'user_data_fetcher': self._user_data_fetcher,
             },
         )
         self._backends.set_backends(backends)
@@ -123,6 +178,7 @@ class Controller:
             'email_service': email_service,
             'external_auth_service': external_auth_service,
             'group_service': group_service,
+            'login_rate_limiter': login_rate_limiter,
             'user_service': self._user_service,
             'token_service': self._token_service,
             'token_manager': self._token_service,  # For compatibility only
@@ -130,6 +186,7 @@ class Controller:
             'tenant_service': self._tenant_service,
             'session_service': session_service,
             'template_formatter': template_formatter,
+            'user_data_fetcher': self._user_data_fetcher,
         }
         Tenant.setup(self._token_service, self._user_service, self._tenant_service)
 
@@ -152,8 +209,18 @@ class Controller:
 
         self._rest_api = CoreRestApi(config, self._token_service, self._user_service)
 
+        leader_election = AdvisoryLockLeaderElection.from_config(
+            config['token_cleanup_leader_election']
+        )
+        if leader_election is not None:
+            self.status_aggregator.add_provider(leader_election.provide_status)
         self._expired_token_remover = token.ExpiredTokenRemover(
-            config, dao, self._bus_publisher
+            config,
+            dao,
+            self._bus_publisher,
+            token_cache,
+            timer_wheel=timer_wheel,
+            leader_election=leader_election,
         )
 
     def run(self):
@@ -161,17 +228,35 @@ class Controller:
 
         with bus.publisher_thread(self._bus_publisher):
             with ServiceCatalogRegistration(*self._service_discovery_args):
+                if self._config['refresh_token_snapshot']:
+                    self._discard_refresh_token_snapshots()
                 self._expired_token_remover.start()
                 local_token_renewer = self._get_local_token_renewer()
+                if local_token_renewer:
+                    local_token_renewer.start()
                 self._config['local_token_renewer'] = local_token_renewer
                 self._rest_api.run()
-                local_token_renewer.revoke_token()
+                if local_token_renewer:
+                    local_token_renewer.stop()
+                    local_token_renewer.revoke_token()
+        self._user_data_fetcher.close()
+        self._password_hashing_executor.shutdown()
 
     def stop(self, reason):
         logger.warning('Stopping wazo-auth: %s', reason)
         self._expired_token_remover.stop()
         self._rest_api.stop()
 
+    def _discard_refresh_token_snapshots(self):
+        # NOTE: the changes made while the snapshots were disabled did not discard them
+        try:
+            self._dao.refresh_token.bump_snapshot_version()
+            commit_or_rollback()
+        except Exception:
+            logger.warning(
+                'failed to discard the refresh token snapshots', exc_info=True
+            )
+
     def _get_local_token_renewer(self):
         try:
             backend = self._backends['wazo_user']
@@ -1,11 +1,13 @@
 # Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 Session = scoped_session(sessionmaker())
 
+ON_COMMIT_KEY = 'wazo_auth_on_commit'
+
 DEFAULT_POOL_SIZE = 5
 
 
@@ -34,3 +36,26 @@ def commit_or_rollback():
         raise
     finally:
         Session.close()
+
+
+def on_commit(callback):
+    """Call callback once the current transaction of the Session is committed
+
+    The callback is dropped if the transaction is rolled back.
+    """
+    Session().info.setdefault(ON_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_on_commit_callbacks(session):
+    if session.transaction is not None and session.transaction.nested:
+        return
+
+    for callback in session.info.pop(ON_COMMIT_KEY, []):
+        callback()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_on_commit_callbacks(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(ON_COMMIT_KEY, None)
@@ -2,11 +2,13 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     CheckConstraint,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     String,
@@ -16,6 +18,7 @@ from sqlalchemy import (
     sql,
     text,
 )
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -26,6 +29,7 @@ Base = declarative_base()
 class ACL(Base):
 
     __tablename__ = 'auth_acl'
+    __table_args__ = (Index('auth_acl__idx__token_uuid', 'token_uuid'),)
 
     id_ = Column(Integer, name='id', primary_key=True)
     value = Column(Text, nullable=False)
@@ -132,6 +136,11 @@ class Tenant(Base):
 class Token(Base):
 
     __tablename__ = 'auth_token'
+    __table_args__ = (
+        Index('auth_token__idx__auth_id', 'auth_id'),
+        Index('auth_token__idx__expire_t', 'expire_t'),
+        Index('auth_token__idx__session_uuid', 'session_uuid'),
+    )
 
     uuid = Column(
         String(38), server_default=text('uuid_generate_v4()'), primary_key=True
@@ -147,15 +156,18 @@ class Token(Base):
     metadata_ = Column(Text, name='metadata')
     user_agent = Column(Text)
     remote_addr = Column(Text)
+    acls = Column(ARRAY(Text), nullable=False, server_default='{}')
 
-    acls = relationship('ACL')
     session = relationship('Session')
 
 
 class RefreshToken(Base):
 
     __tablename__ = 'auth_refresh_token'
-    __table_args__ = (UniqueConstraint('client_id', 'user_uuid'),)
+    __table_args__ = (
+        UniqueConstraint('client_id', 'user_uuid'),
+        Index('auth_refresh_token__idx__user_uuid', 'user_uuid'),
+    )
 
     uuid = Column(
         String(36), server_default=text('uuid_generate_v4()'), primary_key=True
@@ -168,6 +180,9 @@ class RefreshToken(Base):
     remote_addr = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=text('NOW()'))
     mobile = Column(Boolean, nullable=False, default=False)
+    snapshot_version = Column(BigInteger)
+    snapshot_metadata = Column(Text)
+    snapshot_acls = Column(ARRAY(Text))
     user = relationship('User', viewonly=True)
 
     @hybrid_property
@@ -183,9 +198,19 @@ class RefreshToken(Base):
         )
 
 
+class SnapshotVersion(Base):
+
+    __tablename__ = 'auth_snapshot_version'
+    __table_args__ = (CheckConstraint('id = 1'),)
+
+    id_ = Column(Integer, name='id', primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default=text('0'))
+
+
 class Session(Base):
 
     __tablename__ = 'auth_session'
+    __table_args__ = (Index('auth_session__idx__tenant_uuid', 'tenant_uuid'),)
 
     uuid = Column(
         String(36), server_default=text('uuid_generate_v4()'), primary_key=True
@@ -1,7 +1,8 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, exc, text
+from sqlalchemy import and_, exc, func, text
+from sqlalchemy.orm import aliased
 from .base import BaseDAO, PaginatorMixin
 from ..models import Email, Group, GroupPolicy, Policy, User, UserGroup
 from . import filters
@@ -156,6 +157,30 @@ class GroupDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             for group in query.all()
         ]
 
+    def list_with_members(self, user_uuid):
+        members = aliased(UserGroup)
+        query = (
+            self.session.query(
+                Group.uuid,
+                Group.name,
+                func.array_agg(members.user_uuid).label('user_uuids'),
+            )
+            .join(UserGroup, UserGroup.group_uuid == Group.uuid)
+            .join(members, members.group_uuid == Group.uuid)
+            .filter(UserGroup.user_uuid == str(user_uuid))
+            .group_by(Group.uuid, Group.name)
+            .order_by(Group.name)
+        )
+
+        return [
+            {
+                'uuid': group.uuid,
+                'name': group.name,
+                'users': [{'uuid': uuid} for uuid in group.user_uuids],
+            }
+            for group in query.all()
+        ]
+
     def update(self, group_uuid, **body):
         filter_ = Group.uuid == str(group_uuid)
         try:
@@ -1,7 +1,7 @@
 # Copyright 2017-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from sqlalchemy import and_, distinct, exc, func, text
+from sqlalchemy import and_, distinct, exc, func, literal, text, union_all
 from .base import BaseDAO, PaginatorMixin
 from . import filters
 from ..models import (
@@ -10,6 +10,7 @@ from ..models import (
     GroupPolicy,
     Policy,
     Tenant,
+    UserGroup,
     UserPolicy,
 )
 from ... import exceptions
@@ -151,6 +152,35 @@ class PolicyDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
 
         return policies
 
+    def list_acl_templates_of_user(self, user_uuid):
+        user_uuid = str(user_uuid)
+        user_policies = self.session.query(
+            UserPolicy.policy_uuid.label('policy_uuid'), literal('user').label('source')
+        ).filter(UserPolicy.user_uuid == user_uuid)
+        group_policies = (
+            self.session.query(
+                GroupPolicy.policy_uuid.label('policy_uuid'),
+                literal('groups').label('source'),
+            )
+            .join(UserGroup, UserGroup.group_uuid == GroupPolicy.group_uuid)
+            .filter(UserGroup.user_uuid == user_uuid)
+        )
+        policies = union_all(user_policies, group_policies).alias('policies')
+
+        query = (
+            self.session.query(policies.c.source, ACLTemplate.template)
+            .join(
+                ACLTemplatePolicy,
+                ACLTemplatePolicy.policy_uuid == policies.c.policy_uuid,
+            )
+            .join(ACLTemplate, ACLTemplate.id_ == ACLTemplatePolicy.template_id)
+        )
+
+        acl_templates = {'user': [], 'groups': []}
+        for source, template in query.all():
+            acl_templates[source].append(template)
+        return acl_templates
+
     def list_(self, **kwargs):
         search_filter = self.new_search_filter(**kwargs)
         strict_filter = self.new_strict_filter(**kwargs)
@@ -1,13 +1,15 @@
 # Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import json
+
 from sqlalchemy import and_, exc, text
 
 from wazo_auth import exceptions
 
 from . import filters
 from .base import BaseDAO, PaginatorMixin
-from ..models import RefreshToken
+from ..models import RefreshToken, SnapshotVersion
 
 
 class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
@@ -82,6 +84,7 @@ class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             return {
                 'backend_name': refresh_token.backend,
                 'login': refresh_token.login,
+                'snapshot': self._snapshot_to_dict(refresh_token),
             }
 
         raise exceptions.UnknownRefreshToken(client_id)
@@ -146,3 +149,34 @@ class RefreshTokenDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         query = self.session.query(RefreshToken).filter(filter_)
         for refresh_token in query.all():
             return refresh_token.uuid
+
+    def get_snapshot_version(self):
+        return self.session.query(SnapshotVersion.version).scalar()
+
+    def bump_snapshot_version(self):
+        self.session.query(SnapshotVersion).update(
+            {SnapshotVersion.version: SnapshotVersion.version + 1},
+            synchronize_session=False,
+        )
+        self.session.flush()
+
+    def update_snapshot(self, refresh_token_uuid, version, metadata, acls):
+        filter_ = RefreshToken.uuid == str(refresh_token_uuid)
+        values = {
+            'snapshot_version': version,
+            'snapshot_metadata': json.dumps(metadata),
+            'snapshot_acls': acls,
+        }
+        self.session.query(RefreshToken).filter(filter_).update(values)
+        self.session.flush()
+
+    @staticmethod
+    def _snapshot_to_dict(refresh_token):
+        if refresh_token.snapshot_version is None:
+            return None
+
+        return {
+            'version': refresh_token.snapshot_version,
+            'metadata': json.loads(refresh_token.snapshot_metadata),
+            'acls': refresh_token.snapshot_acls,
+        }
@@ -48,20 +48,19 @@ class SessionDAO(PaginatorMixin, BaseDAO):
     def delete(self, session_uuid, tenant_uuids):
         filter_ = Session.uuid == str(session_uuid)
         if not tenant_uuids:
-            return {}, {}
+            return {}, []
         filter_ = and_(filter_, Session.tenant_uuid.in_(tenant_uuids))
 
         session = self.session.query(Session).filter(filter_).first()
         if not session:
-            return {}, {}
+            return {}, []
 
-        token_result = {}
-        for token in session.tokens:
-            token_result = {'uuid': token.uuid, 'auth_id': token.auth_id}
-            break
+        tokens_result = [
+            {'uuid': token.uuid, 'auth_id': token.auth_id} for token in session.tokens
+        ]
 
         session_result = {'uuid': session.uuid, 'tenant_uuid': session.tenant_uuid}
         self.session.query(Session).filter(filter_).delete(synchronize_session=False)
         self.session.flush()
 
-        return session_result, token_result
+        return session_result, tokens_result
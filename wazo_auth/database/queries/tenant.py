@@ -16,6 +16,8 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
     strict_filter = filters.tenant_strict_filter
     column_map = {'name': Tenant.name}
 
+    _top_tenant_uuid = None
+
     def exists(self, tenant_uuid):
         return self.count([str(tenant_uuid)]) > 0
 
@@ -54,7 +56,8 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         parent_uuid = kwargs.get('parent_uuid')
         uuid_ = kwargs.get('uuid')
 
-        if uuid_ and parent_uuid and str(uuid_) == str(parent_uuid):
+        is_top_tenant = bool(uuid_ and parent_uuid and str(uuid_) == str(parent_uuid))
+        if is_top_tenant:
             if self.find_top_tenant():
                 raise exceptions.MasterTenantConflictException()
 
@@ -84,15 +87,25 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
                 if constraint == 'auth_tenant_contact_uuid_fkey':
                     raise exceptions.UnknownUserException(kwargs['contact_uuid'])
             raise
+
+        if is_top_tenant:
+            self.reset_top_tenant()
         return tenant.uuid
 
     def find_top_tenant(self):
-        return (
-            self.session.query(Tenant)
-            .filter(Tenant.uuid == Tenant.parent_uuid)
-            .first()
-            .uuid
-        )
+        if TenantDAO._top_tenant_uuid is None:
+            tenant = (
+                self.session.query(Tenant.uuid)
+                .filter(Tenant.uuid == Tenant.parent_uuid)
+                .first()
+            )
+            if tenant:
+                TenantDAO._top_tenant_uuid = tenant.uuid
+        return TenantDAO._top_tenant_uuid
+
+    @classmethod
+    def reset_top_tenant(cls):
+        cls._top_tenant_uuid = None
 
     def delete(self, uuid):
         tenant = self.session.query(Tenant).get(uuid)
@@ -110,9 +123,8 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
             .scalar()
         )
 
-    def list_visible_tenants(self, scoping_tenant_uuid=None):
-        query = self._tenant_query(scoping_tenant_uuid)
-        return query.all()
+    def list_parents(self):
+        return self.session.query(Tenant.uuid, Tenant.parent_uuid).all()
 
     def list_(self, **kwargs):
         schema = schemas.TenantSchema()
@@ -157,30 +169,3 @@ class TenantDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
                 if constraint == 'auth_tenant_contact_uuid_fkey':
                     raise exceptions.UnknownUserException(kwargs['contact_uuid'])
             raise
-
-    def _tenant_query(self, scoping_tenant_uuid):
-        top_tenant_uuid = self.find_top_tenant()
-        if scoping_tenant_uuid is None:
-            scoping_tenant_uuid = top_tenant_uuid
-
-        if scoping_tenant_uuid == top_tenant_uuid:
-            return self.session.query(Tenant)
-
-        included_tenants = (
-            self.session.query(Tenant.uuid, Tenant.parent_uuid)
-            .filter(Tenant.uuid == str(scoping_tenant_uuid))
-            .cte(recursive=True)
-        )
-        included_tenants = included_tenants.union_all(
-            self.session.query(Tenant.uuid, Tenant.parent_uuid).filter(
-                and_(
-                    Tenant.parent_uuid == included_tenants.c.uuid,
-                    Tenant.uuid != Tenant.parent_uuid,
-                )
-            )
-        )
-        return (
-            self.session.query(Tenant)
-            .select_from(included_tenants)
-            .join(Tenant, Tenant.uuid == included_tenants.c.uuid)
-        )
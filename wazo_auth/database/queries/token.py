@@ -3,60 +3,123 @@
 
 import json
 import time
+import uuid
+
+from sqlalchemy import and_, case, cast, exists, func, select
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by
 
 from .base import BaseDAO
-from ..models import ACL, Session, Tenant, Token as TokenModel
+from .tenant import TenantDAO
+from ..models import ACL, Session, Token as TokenModel
 from ... import exceptions
 
 
 class TokenDAO(BaseDAO):
     def create(self, body, session_body):
-        serialized_metadata = json.dumps(body.get('metadata', {}))
-        token = TokenModel(
-            auth_id=body['auth_id'],
-            pbx_user_uuid=body['pbx_user_uuid'],
-            xivo_uuid=body['xivo_uuid'],
-            issued_t=int(body['issued_t']),
-            expire_t=int(body['expire_t']),
-            user_agent=body['user_agent'],
-            remote_addr=body['remote_addr'],
-            metadata_=serialized_metadata,
-        )
-        token.acls = [
-            ACL(token_uuid=token.uuid, value=acl) for acl in body.get('acls') or []
-        ]
+        token_uuid = str(uuid.uuid4())
+        session_uuid = str(uuid.uuid4())
 
         if not session_body.get('tenant_uuid'):
             session_body['tenant_uuid'] = self._get_default_tenant_uuid()
-        token.session = Session(**session_body)
+        self.session.execute(
+            Session.__table__.insert().values(uuid=session_uuid, **session_body)
+        )
 
-        self.session.add(token)
-        self.session.flush()
-        return token.uuid, token.session_uuid
+        acls = body.get('acls') or []
+        self.session.execute(
+            TokenModel.__table__.insert().values(
+                uuid=token_uuid,
+                session_uuid=session_uuid,
+                auth_id=body['auth_id'],
+                pbx_user_uuid=body['pbx_user_uuid'],
+                xivo_uuid=body['xivo_uuid'],
+                issued_t=int(body['issued_t']),
+                expire_t=int(body['expire_t']),
+                user_agent=body['user_agent'],
+                remote_addr=body['remote_addr'],
+                metadata=json.dumps(body.get('metadata', {})),
+                acls=acls,
+            )
+        )
+
+        # NOTE: the previous version still reads the auth_acl table during a rolling
+        # upgrade, remove when the table is dropped
+        if acls:
+            self.session.execute(
+                ACL.__table__.insert().values(
+                    [{'token_uuid': token_uuid, 'value': acl} for acl in acls]
+                )
+            )
+
+        return token_uuid, session_uuid
 
     def _get_default_tenant_uuid(self):
-        filter_ = Tenant.uuid == Tenant.parent_uuid
-        return self.session.query(Tenant).filter(filter_).first().uuid
+        return TenantDAO().find_top_tenant()
 
     def get(self, token_uuid):
-        token = self.session.query(TokenModel).get(token_uuid)
+        token = self._token_query(TokenModel.uuid == token_uuid).first()
         if token:
-            return {
-                'uuid': token.uuid,
-                'auth_id': token.auth_id,
-                'pbx_user_uuid': token.pbx_user_uuid,
-                'xivo_uuid': token.xivo_uuid,
-                'issued_t': token.issued_t,
-                'expire_t': token.expire_t,
-                'acls': [acl.value for acl in token.acls],
-                'metadata': json.loads(token.metadata_) if token.metadata_ else {},
-                'session_uuid': token.session_uuid,
-                'remote_addr': token.remote_addr,
-                'user_agent': token.user_agent,
-            }
+            return self._token_to_dict(token)
 
         raise exceptions.UnknownTokenException()
 
+    def get_many(self, token_uuids):
+        if not token_uuids:
+            return []
+
+        query = self._token_query(TokenModel.uuid.in_(token_uuids))
+        return [self._token_to_dict(token) for token in query.all()]
+
+    def _token_query(self, filter_):
+        return self.session.query(
+            TokenModel.uuid,
+            TokenModel.auth_id,
+            TokenModel.pbx_user_uuid,
+            TokenModel.xivo_uuid,
+            TokenModel.issued_t,
+            TokenModel.expire_t,
+            TokenModel.metadata_,
+            TokenModel.session_uuid,
+            TokenModel.remote_addr,
+            TokenModel.user_agent,
+            self._acls_column(),
+        ).filter(filter_)
+
+    @staticmethod
+    def _acls_column():
+        # NOTE: the tokens created by the previous version during a rolling upgrade
+        # only have their ACLs in the auth_acl table, remove when the table is dropped
+        legacy_acls = (
+            select([func.array_agg(aggregate_order_by(ACL.value, ACL.id_))])
+            .where(ACL.token_uuid == TokenModel.uuid)
+            .as_scalar()
+        )
+        return case(
+            [
+                (
+                    func.cardinality(TokenModel.acls) == 0,
+                    func.coalesce(legacy_acls, TokenModel.acls),
+                )
+            ],
+            else_=TokenModel.acls,
+        ).label('acls')
+
+    @staticmethod
+    def _token_to_dict(token):
+        return {
+            'uuid': token.uuid,
+            'auth_id': token.auth_id,
+            'pbx_user_uuid': token.pbx_user_uuid,
+            'xivo_uuid': token.xivo_uuid,
+            'issued_t': token.issued_t,
+            'expire_t': token.expire_t,
+            'acls': token.acls or [],
+            'metadata': json.loads(token.metadata_) if token.metadata_ else {},
+            'session_uuid': token.session_uuid,
+            'remote_addr': token.remote_addr,
+            'user_agent': token.user_agent,
+        }
+
     def delete(self, token_uuid):
         filter_ = TokenModel.uuid == token_uuid
 
@@ -80,60 +143,94 @@ class TokenDAO(BaseDAO):
         return token_result, session_result
 
     def get_tokens_and_session_that_expire_soon(self, _time):
-        tokens = self._get_tokens_with_expiration_less_than(time.time() + _time)
-        if not tokens:
-            return [], []
-        filter_ = TokenModel.uuid.in_([token['uuid'] for token in tokens])
-        sessions = self._get_sessions_from_token_filter(filter_)
+        filter_ = TokenModel.expire_t < time.time() + _time
+        query = self.session.query(
+            TokenModel.uuid,
+            TokenModel.auth_id,
+            TokenModel.session_uuid,
+            self._tenant_uuid_column(TokenModel.metadata_),
+        ).filter(filter_)
+
+        tokens, sessions = [], {}
+        for token in query.all():
+            tokens.append(self._expired_token_to_dict(token))
+            sessions.setdefault(token.session_uuid, {'uuid': token.session_uuid})
+        return tokens, list(sessions.values())
+
+    def delete_expired_tokens_and_sessions(self, limit=None, token_uuids=None):
+        tokens = self._delete_expired_tokens(limit, token_uuids)
+        sessions = self._delete_expired_sessions(tokens)
         return tokens, sessions
 
-    def delete_expired_tokens_and_sessions(self):
-        tokens = self._delete_expired_tokens()
-        sessions = self._delete_expired_sessions()
-        self.session.flush()
-        return tokens, sessions
-
-    def _get_tokens_with_expiration_less_than(self, epoch):
-        filter_ = TokenModel.expire_t < epoch
-        tokens = self.session.query(TokenModel).filter(filter_).all()
-        results = []
-        for token in tokens:
-            results.append(
-                {
-                    'uuid': token.uuid,
-                    'auth_id': token.auth_id,
-                    'session_uuid': token.session_uuid,
-                    'metadata': json.loads(token.metadata_) if token.metadata_ else {},
-                }
+    @staticmethod
+    def _tenant_uuid_column(metadata):
+        return cast(metadata, JSON)['tenant_uuid'].astext.label('tenant_uuid')
+
+    @staticmethod
+    def _expired_token_to_dict(token):
+        return {
+            'uuid': token.uuid,
+            'auth_id': token.auth_id,
+            'session_uuid': token.session_uuid,
+            'tenant_uuid': token.tenant_uuid,
+        }
+
+    def _delete_expired_tokens(self, limit, token_uuids):
+        table = TokenModel.__table__
+        filter_ = table.c.expire_t < time.time()
+        if token_uuids is not None:
+            filter_ = and_(filter_, table.c.uuid.in_(token_uuids))
+        expired = (
+            select([table.c.uuid])
+            .where(filter_)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            table.delete()
+            .where(table.c.uuid.in_(expired))
+            .returning(
+                table.c.uuid,
+                table.c.auth_id,
+                table.c.session_uuid,
+                self._tenant_uuid_column(table.c.metadata),
             )
-        return results
+        )
+        return [
+            self._expired_token_to_dict(token) for token in self.session.execute(query)
+        ]
 
-    def _get_sessions_from_token_filter(self, filter_):
-        sessions = (
-            self.session.query(Session.uuid).outerjoin(TokenModel).filter(filter_).all()
+    def delete_orphan_sessions(self, limit=None):
+        table = Session.__table__
+        orphans = (
+            select([table.c.uuid])
+            .where(self._without_token(table))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
         )
-        results = []
-        for session in sessions:
-            results.append({'uuid': session.uuid})
-        return results
-
-    def _delete_expired_tokens(self):
-        results = self._get_tokens_with_expiration_less_than(time.time())
-        if not results:
-            return results
-        token_uuids = [token['uuid'] for token in results]
-        filter_ = TokenModel.uuid.in_(token_uuids)
-        self.session.query(TokenModel).filter(filter_).delete(synchronize_session=False)
-        self.session.flush()
-        return results
-
-    def _delete_expired_sessions(self):
-        filter_ = TokenModel.uuid.is_(None)
-        results = self._get_sessions_from_token_filter(filter_)
-        if not results:
-            return results
-        session_uuids = [session['uuid'] for session in results]
-        filter_ = Session.uuid.in_(session_uuids)
-        self.session.query(Session).filter(filter_).delete(synchronize_session=False)
-        self.session.flush()
-        return results
+        query = (
+            table.delete()
+            .where(table.c.uuid.in_(orphans))
+            .returning(table.c.uuid, table.c.tenant_uuid)
+        )
+        return [
+            {'uuid': session.uuid, 'tenant_uuid': session.tenant_uuid}
+            for session in self.session.execute(query)
+        ]
+
+    def _delete_expired_sessions(self, tokens):
+        session_uuids = {token['session_uuid'] for token in tokens}
+        if not session_uuids:
+            return []
+
+        table = Session.__table__
+        query = (
+            table.delete()
+            .where(and_(table.c.uuid.in_(session_uuids), self._without_token(table)))
+            .returning(table.c.uuid)
+        )
+        return [{'uuid': session.uuid} for session in self.session.execute(query)]
+
+    @staticmethod
+    def _without_token(table):
+        return ~exists().where(TokenModel.session_uuid == table.c.uuid)
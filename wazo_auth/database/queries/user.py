@@ -197,17 +197,37 @@ class UserDAO(filters.FilterMixin, PaginatorMixin, BaseDAO):
         self.session.delete(user)
         self.session.flush()
 
-    def get_credentials(self, username):
+    def get_by_username(self, username):
+        query = self.session.query(
+            User.uuid, User.purpose, User.tenant_uuid, User.enabled
+        ).filter(User.username == username)
+
+        for row in query.all():
+            return {
+                'uuid': row.uuid,
+                'purpose': row.purpose,
+                'tenant_uuid': row.tenant_uuid,
+                'enabled': row.enabled,
+            }
+
+        raise exceptions.UnknownUsernameException(username)
+
+    def get_login_credentials(self, username):
         filter_ = and_(
             self.new_strict_filter(username=username), User.enabled.is_(True)
         )
 
-        query = self.session.query(User.password_salt, User.password_hash).filter(
-            filter_
-        )
+        query = self.session.query(
+            User.uuid, User.purpose, User.password_salt, User.password_hash
+        ).filter(filter_)
 
         for row in query.all():
-            return row.password_hash, row.password_salt
+            return {
+                'uuid': row.uuid,
+                'purpose': row.purpose,
+                'password_hash': row.password_hash,
+                'password_salt': row.password_salt,
+            }
 
         raise exceptions.UnknownUsernameException(username)
 
@@ -262,6 +262,18 @@ class MasterTenantConflictException(APIException):
         super().__init__(403, 'Conflict detected', 'conflict', details, 'tenants')
 
 
+class PasswordHashingOverloadedException(APIException):
+    def __init__(self):
+        msg = 'Too many password verifications in progress, retry later'
+        super().__init__(503, msg, 'password-hashing-overloaded', {}, 'users')
+
+
+class TooManyLoginAttemptsException(APIException):
+    def __init__(self):
+        msg = 'Too many login attempts, retry later'
+        super().__init__(429, msg, 'too-many-login-attempts', {}, 'tokens')
+
+
 class DuplicatePolicyException(TokenServiceException):
 
     code = 409
@@ -53,8 +53,7 @@ class Tenant:
         if specified_tenant == user_tenant:
             return cls(user_tenant)
 
-        sub_tenants = cls._get_all_sub_tenants(user_tenant)
-        if specified_tenant in sub_tenants:
+        if cls._is_sub_tenant(specified_tenant, user_tenant):
             return cls(specified_tenant)
 
         raise tenant_helpers.UnauthorizedTenant(specified_tenant)
@@ -94,8 +93,8 @@ class Tenant:
         return [cls(t['uuid'], t['name']) for t in user_tenants]
 
     @classmethod
-    def _get_all_sub_tenants(cls, tenant_uuid):
-        return cls.tenant_service.list_sub_tenants(tenant_uuid)
+    def _is_sub_tenant(cls, tenant_uuid, scoping_tenant_uuid):
+        return cls.tenant_service.is_sub_tenant(tenant_uuid, scoping_tenant_uuid)
 
     @classmethod
     def setup(cls, token_service, user_service, tenant_service):
@@ -2,16 +2,22 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
+import threading
 import time
 
 from functools import partial
 from jinja2 import StrictUndefined, Template
 from jinja2.exceptions import UndefinedError
 
-from wazo_auth.database.helpers import commit_or_rollback
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import Session, commit_or_rollback
 
 logger = logging.getLogger(__name__)
 
+ACL_TEMPLATE_CACHE_SIZE = 1024
+
+_compiled_templates = LRUCache(ACL_TEMPLATE_CACHE_SIZE)
+
 
 class LazyTemplateRenderer:
     def __init__(self, acl_templates, get_data_fn, *args, **kwargs):
@@ -30,7 +36,14 @@ class LazyTemplateRenderer:
         return acls
 
     def _evaluate_template(self, acl_template):
-        template = Template(acl_template, undefined=StrictUndefined)
+        if '{' not in acl_template:
+            # NOTE: no jinja expression, statement or comment to render
+            for acl in acl_template.split(':'):
+                if acl:
+                    yield acl
+            return
+
+        template = self._get_template(acl_template)
         try:
             rendered_template = template.render(self._data)
             for acl in rendered_template.split(':'):
@@ -49,6 +62,14 @@ class LazyTemplateRenderer:
                 if acl:
                     yield acl
 
+    @staticmethod
+    def _get_template(acl_template):
+        template = _compiled_templates.get(acl_template)
+        if not template:
+            template = Template(acl_template, undefined=StrictUndefined)
+            _compiled_templates.set(acl_template, template)
+        return template
+
 
 class LocalTokenRenewer:
     def __init__(self, backend, token_service, user_service, username='wazo-auth'):
@@ -60,29 +81,94 @@ class LocalTokenRenewer:
         self._renew_time = time.time() - 5
         self._delay = 3600
         self._threshold = 30
+        self._retry_interval = 10
 
-    def get_token(self):
-        # get_token MUST be called before any DB operations during the HTTP request
-        # otherwise previous changes will be commited event if an error occurs later
-        if self._need_new_token():
-            if not self._user_exists(self._username):
-                logger.info(
-                    '%s user not found no local token will be created', self._username
-                )
-                return
+        self._lock = threading.Lock()
+        self._tombstone = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='local_token_renewer')
+        self._thread.daemon = True
 
-            self._renew_time = time.time() + self._delay - self._threshold
-            self._token = self._new_token(
-                {
-                    'expiration': 3600,
-                    'backend': 'wazo_user',
-                    'user_agent': '',
-                    'remote_addr': '127.0.0.1',
-                }
-            )
-            commit_or_rollback()
+    def start(self):
+        try:
+            self._renew()
+        except Exception:
+            logger.warning('failed to create the local token', exc_info=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread.is_alive():
+            return
+        self._tombstone.set()
+        self._thread.join()
+        self._tombstone.clear()
 
-        return self._token.token
+    def get_token(self):
+        if self._thread.is_alive():
+            # NOTE: the background thread renews the token ahead of its expiration
+            with self._lock:
+                token = self._token
+        else:
+            # get_token MUST be called before any DB operations during the HTTP request
+            # otherwise previous changes will be commited event if an error occurs later
+            with self._lock:
+                if self._need_new_token():
+                    self._renew_locked(self._create_token())
+                token = self._token
+
+        return token.token if token else None
+
+    def _loop(self):
+        while not self._tombstone.wait(self._time_until_renewal()):
+            try:
+                self._renew()
+            except Exception:
+                logger.warning('failed to renew the local token', exc_info=True)
+                with self._lock:
+                    self._renew_time = time.time() + self._retry_interval
+
+    def _renew(self):
+        # NOTE: the background thread has its own scoped session, it must not be left
+        # in a failed transaction or keep its connection between renewals
+        try:
+            token = self._create_token()
+        except Exception:
+            Session.rollback()
+            raise
+        finally:
+            Session.close()
+
+        with self._lock:
+            self._renew_locked(token)
+
+    def _renew_locked(self, token):
+        if not token:
+            self._renew_time = time.time() + self._retry_interval
+            return
+
+        self._token = token
+        self._renew_time = time.time() + self._delay - self._threshold
+
+    def _create_token(self):
+        if not self._user_exists(self._username):
+            logger.info(
+                '%s user not found no local token will be created', self._username
+            )
+            return
+
+        token = self._new_token(
+            {
+                'expiration': self._delay,
+                'backend': 'wazo_user',
+                'user_agent': '',
+                'remote_addr': '127.0.0.1',
+            }
+        )
+        commit_or_rollback()
+        return token
+
+    def _time_until_renewal(self):
+        with self._lock:
+            return max(self._renew_time - time.time(), 0)
 
     def _user_exists(self, username):
         if self._user_service.list_users(username=username):
@@ -0,0 +1,126 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import socket
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from xivo.status import Status
+
+from .database.helpers import Session
+
+logger = logging.getLogger(__name__)
+
+ACQUIRE_QUERY = text('SELECT pg_try_advisory_lock(:lock_id)')
+SET_NAME_QUERY = text("SELECT set_config('application_name', :name, false)")
+LEADER_QUERY = text(
+    '''
+    SELECT activity.application_name AS name, locks.pid = pg_backend_pid() AS is_self
+    FROM pg_locks AS locks
+    JOIN pg_stat_activity AS activity ON activity.pid = locks.pid
+    WHERE locks.locktype = 'advisory'
+    AND locks.granted
+    AND locks.classid = CAST(:classid AS oid)
+    AND locks.objid = CAST(:objid AS oid)
+    AND locks.objsubid = 1
+    '''
+)
+MIN_LOCK_ID = -(2 ** 63)
+MAX_LOCK_ID = 2 ** 63 - 1
+
+
+class AdvisoryLockLeaderElection:
+    """Elect a leader among the nodes sharing a database
+
+    The leader is the node holding a session-level advisory lock on a dedicated
+    connection. The lock is released by PostgreSQL when that connection is lost,
+    another node then acquires it on its next election. The connection is not
+    pooled, a connection returned to a pool would keep the lock.
+    """
+
+    def __init__(self, lock_id, name=None):
+        self._lock_id = lock_id
+        # NOTE: pg_locks splits a bigint advisory lock key in its high and low 32 bits
+        key = lock_id & 0xFFFFFFFFFFFFFFFF
+        self._classid, self._objid = key >> 32, key & 0xFFFFFFFF
+        self._name = name or socket.gethostname()
+        self._engine = None
+        self._connection = None
+        self._is_leader = False
+        self._leader = None
+        self._lock = threading.Lock()
+
+    def elect(self):
+        try:
+            is_leader, leader = self._elect()
+        except Exception as e:
+            logger.warning('leader election failed: %s', e)
+            self._close()
+            is_leader, leader = False, None
+
+        with self._lock:
+            if is_leader != self._is_leader:
+                logger.info('%s leadership', 'acquired' if is_leader else 'lost')
+            self._is_leader, self._leader = is_leader, leader
+        return is_leader
+
+    def release(self):
+        self._close()
+        with self._lock:
+            self._is_leader, self._leader = False, None
+
+    def provide_status(self, status):
+        with self._lock:
+            status['leader_election'] = {
+                'status': Status.ok,
+                'name': self._name,
+                'leader': self._leader,
+                'is_leader': self._is_leader,
+            }
+
+    def _elect(self):
+        if self._connection is None:
+            if self._engine is None:
+                url = Session.get_bind().url
+                self._engine = create_engine(url, poolclass=NullPool)
+            connection = self._engine.connect()
+            self._connection = connection.execution_options(
+                isolation_level='AUTOCOMMIT'
+            )
+            self._connection.execute(SET_NAME_QUERY, name=self._name)
+
+        if not self._is_leader:
+            self._connection.execute(ACQUIRE_QUERY, lock_id=self._lock_id)
+
+        # Also checks that the connection holding the lock is still alive
+        leader = self._connection.execute(
+            LEADER_QUERY, classid=self._classid, objid=self._objid
+        ).first()
+        if not leader:
+            return False, None
+        return leader.is_self, leader.name
+
+    def _close(self):
+        if self._connection is None:
+            return
+
+        try:
+            # NOTE: closes the DBAPI connection, which releases the lock
+            self._connection.invalidate()
+            self._connection.close()
+        except Exception:
+            logger.debug('failed to close the leader election connection')
+        self._connection = None
+
+    @classmethod
+    def from_config(cls, config):
+        if not config['enabled']:
+            return None
+
+        lock_id = config['lock_id']
+        if not isinstance(lock_id, int) or not MIN_LOCK_ID <= lock_id <= MAX_LOCK_ID:
+            msg = 'token_cleanup_leader_election lock_id must be a 64 bits integer: {}'
+            raise ValueError(msg.format(lock_id))
+        return cls(lock_id, config['name'])
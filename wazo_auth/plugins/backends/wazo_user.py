@@ -18,13 +18,20 @@ class WazoUser(UserAuthenticationBackend):
     def get_acls(self, login, args):
         backend_acl_templates = args.get('acl_templates', [])
         metadata = args.get('metadata', {})
-        group_acl_templates = self._group_service.get_acl_templates(login)
-        user_acl_templates = self._user_service.get_acl_templates(login)
+        login_context = self._user_service.get_login_context(login, args)
+        group_acl_templates = self._group_service.get_acl_templates(
+            login, login_context
+        )
+        user_acl_templates = self._user_service.get_acl_templates(login, login_context)
 
         acl_templates = backend_acl_templates + group_acl_templates + user_acl_templates
 
         return self.render_acl(
-            acl_templates, self.get_user_data, username=login, metadata=metadata
+            acl_templates,
+            self.get_user_data,
+            username=login,
+            metadata=metadata,
+            login_context=login_context,
         )
 
     def verify_password(self, username, password, args):
@@ -32,7 +39,7 @@ class WazoUser(UserAuthenticationBackend):
 
     def get_metadata(self, login, args):
         metadata = {}
-        purpose = self._user_service.list_users(username=login)[0]['purpose']
+        purpose = self._user_service.get_login_context(login, args).user['purpose']
         for plugin in self._purposes.get(purpose).metadata_plugins:
             metadata.update(plugin.get_token_metadata(login, args))
         return metadata
@@ -40,7 +47,11 @@ class WazoUser(UserAuthenticationBackend):
     def get_user_data(self, *args, **kwargs):
         metadata = kwargs['metadata']
         result = {}
-        purpose = self._user_service.get_user(metadata['uuid'])['purpose']
+        login_context = kwargs.get('login_context')
+        if login_context:
+            purpose = login_context.user['purpose']
+        else:
+            purpose = self._user_service.get_user(metadata['uuid'])['purpose']
         for plugin in self._purposes.get(purpose).metadata_plugins:
             result.update(plugin.get_acl_metadata(uuid=metadata['uuid']))
         return result
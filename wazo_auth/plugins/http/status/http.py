@@ -3,13 +3,18 @@
 
 from xivo.status import Status
 
-from wazo_auth.http import ErrorCatchingResource
+from wazo_auth.http import ErrorCatchingResource, auth_verifier, required_acl
 
 
 class StatusList(ErrorCatchingResource):
     def __init__(self, status_aggregator):
         self.status_aggregator = status_aggregator
 
+    @auth_verifier.verify_token
+    @required_acl('auth.status.read')
+    def get(self):
+        return self.status_aggregator.status(), 200
+
     def head(self):
         for component in self.status_aggregator.status().values():
             if component.get('status') == Status.fail:
@@ -19,6 +19,26 @@ class BaseResource(http.ErrorCatchingResource):
         self._user_service = user_service
         self._authentication_service = authentication_service
 
+    def _assert_token_has_tenant_permission(self, token, tenant):
+        if not tenant:
+            return
+
+        # TODO: when the ldap_user gets remove all tokens will have a UUID
+        user_uuid = token.metadata.get('uuid')
+        if not user_uuid:
+            # Fallback on the token data since this is not a user token
+            visible_tenants = set(t['uuid'] for t in token.metadata['tenants'])
+            if tenant not in visible_tenants:
+                raise exceptions.MissingTenantTokenException(tenant)
+            else:
+                return
+
+        if not self._user_has_sub_tenant(token, user_uuid, tenant):
+            raise exceptions.MissingTenantTokenException(tenant)
+
+    def _user_has_sub_tenant(self, token, user_uuid, tenant):
+        return self._user_service.user_has_sub_tenant(user_uuid, tenant)
+
 
 class _BaseRefreshTokens(http.AuthResource):
     def __init__(self, token_service, user_service, authentication_service):
@@ -133,6 +153,12 @@ class RefreshTokens(_BaseRefreshTokens):
 
 
 class Tokens(BaseResource):
+    def __init__(
+        self, token_service, user_service, authentication_service, login_rate_limiter
+    ):
+        super().__init__(token_service, user_service, authentication_service)
+        self._login_rate_limiter = login_rate_limiter
+
     def post(self):
         user_agent = request.headers.get('User-Agent', '')
         remote_addr = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
@@ -151,6 +177,8 @@ class Tokens(BaseResource):
         args['user_agent'] = user_agent
         args['remote_addr'] = remote_addr
 
+        self._login_rate_limiter.check(remote_addr, args.get('login'))
+
         try:
             backend, login = self._authentication_service.verify_auth(args)
         except (
@@ -176,33 +204,56 @@ class Token(BaseResource):
         scope = request.args.get('scope')
         tenant = request.args.get('tenant')
 
-        token = self._token_service.get(token_uuid, scope).to_dict()
+        token = self._token_service.get(token_uuid, scope)
         self._assert_token_has_tenant_permission(token, tenant)
 
-        return {'data': token}
+        return {'data': token.to_dict()}
 
     def head(self, token_uuid):
         scope = request.args.get('scope')
         tenant = request.args.get('tenant')
 
-        token = self._token_service.get(token_uuid, scope).to_dict()
+        token = self._token_service.get(token_uuid, scope)
         self._assert_token_has_tenant_permission(token, tenant)
 
         return '', 204
 
-    def _assert_token_has_tenant_permission(self, token, tenant):
-        if not tenant:
-            return
 
-        # TODO: when the ldap_user gets remove all tokens will have a UUID
-        user_uuid = token['metadata'].get('uuid')
-        if not user_uuid:
-            # Fallback on the token data since this is not a user token
-            visible_tenants = set(t['uuid'] for t in token['metadata']['tenants'])
-            if tenant not in visible_tenants:
-                raise exceptions.MissingTenantTokenException(tenant)
-            else:
-                return
+class TokenChecks(BaseResource):
+    def post(self):
+        try:
+            args = schemas.TokenCheckRequestSchema().load(request.get_json(force=True))
+        except marshmallow.ValidationError as e:
+            return http._error(400, str(e.messages))
 
-        if not self._user_service.user_has_sub_tenant(user_uuid, tenant):
-            raise exceptions.MissingTenantTokenException(tenant)
+        checks = args['items']
+        tokens = self._token_service.get_many([check['token'] for check in checks])
+
+        items = []
+        for check in checks:
+            token = tokens.get(check['token'])
+            items.append(dict(check, valid=self._is_valid(token, check)))
+
+        return {'items': items}, 200
+
+    def _is_valid(self, token, check):
+        if not token or not token.matches_required_acl(check['scope']):
+            return False
+
+        try:
+            self._assert_token_has_tenant_permission(token, check['tenant'])
+        except (
+            exceptions.MissingTenantTokenException,
+            exceptions.UnknownUserException,
+        ):
+            return False
+
+        return True
+
+    def _user_has_sub_tenant(self, token, user_uuid, tenant):
+        # NOTE: the tenant of a user does not change, use the one of the token
+        # instead of fetching the user for each item
+        user_tenant_uuid = token.metadata.get('tenant_uuid')
+        if not user_tenant_uuid:
+            return super()._user_has_sub_tenant(token, user_uuid, tenant)
+        return self._user_service.is_sub_tenant(tenant, user_tenant_uuid)
@@ -13,7 +13,12 @@ class Plugin:
             dependencies['authentication_service'],
         )
 
-        api.add_resource(http.Tokens, '/token', resource_class_args=args)
+        api.add_resource(
+            http.Tokens,
+            '/token',
+            resource_class_args=args + (dependencies['login_rate_limiter'],),
+        )
+        api.add_resource(http.TokenChecks, '/token/check', resource_class_args=args)
         api.add_resource(
             http.Token, '/token/<string:token_uuid>', resource_class_args=args
         )
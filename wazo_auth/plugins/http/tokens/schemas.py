@@ -48,6 +48,18 @@ class TokenRequestSchema(Schema):
             )
 
 
+class TokenCheckSchema(Schema):
+    token = fields.String(required=True, validate=Length(min=1))
+    scope = fields.String(missing=None)
+    tenant = fields.String(missing=None)
+
+
+class TokenCheckRequestSchema(Schema):
+    items = fields.Nested(
+        TokenCheckSchema, many=True, required=True, validate=Length(max=1000)
+    )
+
+
 class RefreshTokenListSchema(BaseListSchema):
     sort_columns = ['created_at', 'client_id', 'mobile']
     default_sort_column = 'created_at'
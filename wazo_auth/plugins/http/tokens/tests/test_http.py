@@ -0,0 +1,68 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import assert_that, equal_to
+from mock import Mock, sentinel as s
+
+from wazo_auth import exceptions, services
+from ..http import Token, TokenChecks
+
+
+class TestTokenChecks(TestCase):
+    def setUp(self):
+        self.user_service = Mock(services.UserService)
+        self.resource = TokenChecks(Mock(), self.user_service, Mock())
+
+    def test_tenant_check_uses_the_tenant_of_the_token(self):
+        token = Mock(metadata={'uuid': s.user_uuid, 'tenant_uuid': s.user_tenant})
+        token.matches_required_acl.return_value = True
+        self.user_service.is_sub_tenant.side_effect = [True, False]
+
+        check = {'token': s.token, 'scope': s.scope, 'tenant': s.tenant}
+        assert_that(self.resource._is_valid(token, check), equal_to(True))
+        assert_that(self.resource._is_valid(token, check), equal_to(False))
+
+        self.user_service.is_sub_tenant.assert_called_with(s.tenant, s.user_tenant)
+        self.user_service.user_has_sub_tenant.assert_not_called()
+        self.user_service.get_user.assert_not_called()
+
+    def test_tenant_check_without_the_tenant_of_the_token(self):
+        token = Mock(metadata={'uuid': s.user_uuid})
+        token.matches_required_acl.return_value = True
+        self.user_service.user_has_sub_tenant.return_value = True
+
+        check = {'token': s.token, 'scope': s.scope, 'tenant': s.tenant}
+        assert_that(self.resource._is_valid(token, check), equal_to(True))
+
+        self.user_service.user_has_sub_tenant.assert_called_once_with(
+            s.user_uuid, s.tenant
+        )
+
+    def test_tenant_check_of_a_deleted_user(self):
+        token = Mock(metadata={'uuid': s.user_uuid})
+        token.matches_required_acl.return_value = True
+        self.user_service.user_has_sub_tenant.side_effect = exceptions.UnknownUserException(
+            s.user_uuid
+        )
+
+        check = {'token': s.token, 'scope': s.scope, 'tenant': s.tenant}
+        assert_that(self.resource._is_valid(token, check), equal_to(False))
+
+
+class TestToken(TestCase):
+    def setUp(self):
+        self.user_service = Mock(services.UserService)
+        self.resource = Token(Mock(), self.user_service, Mock())
+
+    def test_tenant_check_resolves_the_tenant_of_the_user(self):
+        token = Mock(metadata={'uuid': s.user_uuid, 'tenant_uuid': s.user_tenant})
+        self.user_service.user_has_sub_tenant.return_value = True
+
+        self.resource._assert_token_has_tenant_permission(token, s.tenant)
+
+        self.user_service.user_has_sub_tenant.assert_called_once_with(
+            s.user_uuid, s.tenant
+        )
+        self.user_service.is_sub_tenant.assert_not_called()
@@ -15,8 +15,7 @@ class DefaultInternal(BaseMetadata):
 
     def get_token_metadata(self, login, args):
         metadata = super().get_token_metadata(login, args)
-        user_uuid = self._get_user_uuid(login)
-        user = self._user_service.get_user(user_uuid)
+        user = self._user_service.get_login_context(login, args).user
 
         metadata['uuid'] = metadata['auth_id']
         metadata['tenant_uuid'] = user['tenant_uuid']
@@ -24,7 +23,3 @@ class DefaultInternal(BaseMetadata):
 
     def get_acl_metadata(self, **kwargs):
         return {}
-
-    def _get_user_uuid(self, username):
-        matching_users = self._user_service.list_users(username=username)
-        return matching_users[0]['uuid']
@@ -0,0 +1,98 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import threading
+import time
+
+from xivo.status import Status
+
+from .cache import LRUCache
+from .exceptions import TooManyLoginAttemptsException
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    def __init__(self, burst, period, max_keys):
+        self._burst = burst
+        self._rate = burst / period
+        self._buckets = LRUCache(max_keys)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self._burst, now))
+            tokens = min(self._burst, tokens + (now - updated_at) * self._rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets.set(key, (tokens, now))
+            return allowed
+
+    @classmethod
+    def from_config(cls, config, max_keys):
+        return cls(config['burst'], config['period'], max_keys)
+
+
+class LoginRateLimiter:
+    def __init__(self, source_limiter=None, login_limiter=None):
+        self._source_limiter = source_limiter
+        self._login_limiter = login_limiter
+        self._lock = threading.Lock()
+        self._accepted = 0
+        self._rejected_by_source = 0
+        self._rejected_by_login = 0
+
+    def check(self, remote_addr, login):
+        if not self._acquire(self._source_limiter, remote_addr):
+            with self._lock:
+                self._rejected_by_source += 1
+            logger.info('too many login attempts from %s', remote_addr)
+            raise TooManyLoginAttemptsException()
+
+        if login and not self._acquire(self._login_limiter, login):
+            with self._lock:
+                self._rejected_by_login += 1
+            logger.info('too many login attempts for %s from %s', login, remote_addr)
+            raise TooManyLoginAttemptsException()
+
+        with self._lock:
+            self._accepted += 1
+
+    def provide_status(self, status):
+        with self._lock:
+            status['login_rate_limiter'] = {
+                'status': Status.ok,
+                'accepted': self._accepted,
+                'rejected_by_source': self._rejected_by_source,
+                'rejected_by_login': self._rejected_by_login,
+                'tracked_sources': self._count_keys(self._source_limiter),
+                'tracked_logins': self._count_keys(self._login_limiter),
+            }
+
+    @staticmethod
+    def _acquire(limiter, key):
+        # NOTE: an empty limiter is falsy, compare with None
+        if limiter is None:
+            return True
+        return limiter.acquire(key)
+
+    @staticmethod
+    def _count_keys(limiter):
+        return len(limiter) if limiter is not None else 0
+
+    @classmethod
+    def from_config(cls, config):
+        if not config['enabled']:
+            return cls()
+
+        max_keys = config['max_keys']
+        return cls(
+            TokenBucketLimiter.from_config(config['source'], max_keys),
+            TokenBucketLimiter.from_config(config['login'], max_keys),
+        )
@@ -9,7 +9,7 @@ from .policy import PolicyService
 from .session import SessionService
 from .tenant import TenantService
 from .token import TokenService
-from .user import UserService, PasswordEncrypter
+from .user import UserService, PasswordEncrypter, PasswordHashingExecutor
 
 __all__ = [
     "AuthenticationService",
@@ -17,6 +17,7 @@ __all__ = [
     "ExternalAuthService",
     "GroupService",
     "PasswordEncrypter",
+    "PasswordHashingExecutor",
     "PolicyService",
     "SessionService",
     "TenantService",
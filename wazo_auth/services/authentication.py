@@ -20,6 +20,7 @@ class AuthenticationService:
                 refresh_token, args['client_id']
             )
             backend = self._get_backend(refresh_token_data['backend_name'])
+            args['refresh_token_snapshot'] = refresh_token_data.get('snapshot')
             return backend, refresh_token_data['login']
         else:
             backend = self._get_backend(args['backend'])
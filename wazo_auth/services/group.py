@@ -2,15 +2,31 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from wazo_auth import exceptions
-from wazo_auth.services.helpers import BaseService
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import on_commit
+from wazo_auth.services.helpers import BaseService, LoginContext
 
 
 class GroupService(BaseService):
+    def __init__(
+        self, dao, tenant_tree, acl_template_cache=None, refresh_token_snapshot=False
+    ):
+        super().__init__(dao, tenant_tree, refresh_token_snapshot)
+        if acl_template_cache is None:
+            acl_template_cache = LRUCache(0)
+        self._acl_template_cache = acl_template_cache
+
     def add_policy(self, group_uuid, policy_uuid):
-        return self._dao.group.add_policy(group_uuid, policy_uuid)
+        result = self._dao.group.add_policy(group_uuid, policy_uuid)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        return result
 
     def add_user(self, group_uuid, user_uuid):
-        return self._dao.group.add_user(group_uuid, user_uuid)
+        result = self._dao.group.add_user(group_uuid, user_uuid)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        return result
 
     def count(self, scoping_tenant_uuid, recurse=False, **kwargs):
         if scoping_tenant_uuid:
@@ -31,7 +47,10 @@ class GroupService(BaseService):
 
     def delete(self, group_uuid, scoping_tenant_uuid):
         tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
-        return self._dao.group.delete(group_uuid, tenant_uuids=tenant_uuids)
+        result = self._dao.group.delete(group_uuid, tenant_uuids=tenant_uuids)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        return result
 
     def get(self, group_uuid, scoping_tenant_uuid):
         args = {
@@ -46,16 +65,22 @@ class GroupService(BaseService):
 
         raise exceptions.UnknownGroupException(group_uuid)
 
-    def get_acl_templates(self, username):
-        users = self._dao.user.list_(username=username, limit=1)
-        acl_templates = []
-        for user in users:
-            groups = self._dao.group.list_(user_uuid=user['uuid'])
-            for group in groups:
-                policies = self.list_policies(group['uuid'])
-                for policy in policies:
-                    acl_templates.extend(policy['acl_templates'])
-        return acl_templates
+    def get_acl_templates(self, username, login_context=None):
+        cache_key = ('groups', username)
+        acl_templates = self._acl_template_cache.get(cache_key)
+        if acl_templates is not None:
+            return list(acl_templates)
+
+        if login_context is None:
+            login_context = LoginContext(self._dao, self._tenant_tree, username)
+
+        try:
+            acl_templates = login_context.acl_templates['groups']
+        except exceptions.UnknownUsernameException:
+            return []
+
+        self._acl_template_cache.set(cache_key, list(acl_templates))
+        return list(acl_templates)
 
     def list_(self, scoping_tenant_uuid=None, recurse=False, **kwargs):
         if scoping_tenant_uuid:
@@ -74,6 +99,8 @@ class GroupService(BaseService):
     def remove_policy(self, group_uuid, policy_uuid):
         nb_deleted = self._dao.group.remove_policy(group_uuid, policy_uuid)
         if nb_deleted:
+            self._bump_snapshot_version()
+            on_commit(self._acl_template_cache.clear)
             return
 
         if not self._dao.group.exists(group_uuid):
@@ -85,6 +112,8 @@ class GroupService(BaseService):
     def remove_user(self, group_uuid, user_uuid):
         nb_deleted = self._dao.group.remove_user(group_uuid, user_uuid)
         if nb_deleted:
+            self._bump_snapshot_version()
+            on_commit(self._acl_template_cache.clear)
             return
 
         if not self._dao.group.exists(group_uuid):
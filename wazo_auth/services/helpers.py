@@ -3,17 +3,26 @@
 
 import logging
 import os
+import threading
+import time
 
 from jinja2 import BaseLoader, Environment, TemplateNotFound
 
+from wazo_auth import exceptions
+
 logger = logging.getLogger(__name__)
 
 
 class BaseService:
-    def __init__(self, dao, tenant_tree):
+    def __init__(self, dao, tenant_tree, refresh_token_snapshot=False):
         self._dao = dao
         self._top_tenant_uuid = None
         self._tenant_tree = tenant_tree
+        self._refresh_token_snapshot = refresh_token_snapshot
+
+    def _bump_snapshot_version(self):
+        if self._refresh_token_snapshot:
+            self._dao.refresh_token.bump_snapshot_version()
 
     def _get_scoped_tenant_uuids(self, scoping_tenant_uuid, recurse):
         if recurse:
@@ -28,6 +37,57 @@ class BaseService:
         return self._top_tenant_uuid
 
 
+class LoginContext:
+    # NOTE: loaded lazily and shared through the args of a login, to avoid fetching the
+    # same user, groups, tenants and ACL templates from each backend and metadata plugin
+    def __init__(self, dao, tenant_tree, login, get_user_by_username=None):
+        self.login = login
+        self._dao = dao
+        self._tenant_tree = tenant_tree
+        self._get_user_by_username = get_user_by_username or dao.user.get_by_username
+        self._user = None
+        self._groups = None
+        self._tenants = None
+        self._acl_templates = None
+
+    @property
+    def user(self):
+        if self._user is None:
+            self._user = self._get_user_by_username(self.login)
+        return self._user
+
+    @property
+    def groups(self):
+        if self._groups is None:
+            self._groups = self._dao.group.list_with_members(self.user['uuid'])
+        return self._groups
+
+    @property
+    def acl_templates(self):
+        if self._acl_templates is None:
+            self._acl_templates = self._dao.policy.list_acl_templates_of_user(
+                self.user['uuid']
+            )
+        return self._acl_templates
+
+    @property
+    def tenant(self):
+        tenant_uuid = self.user['tenant_uuid']
+        for tenant in self.tenants:
+            if tenant['uuid'] == tenant_uuid:
+                return tenant
+        raise exceptions.UnknownTenantException(tenant_uuid)
+
+    @property
+    def tenants(self):
+        if self._tenants is None:
+            tenant_uuids = self._tenant_tree.list_visible_tenants(
+                self.user['tenant_uuid']
+            )
+            self._tenants = self._dao.tenant.list_(tenant_uuids=tenant_uuids)
+        return self._tenants
+
+
 class TemplateLoader(BaseLoader):
 
     _templates = {
@@ -84,9 +144,124 @@ class TemplateFormatter:
 
 
 class TenantTree:
-    def __init__(self, tenant_dao):
+    # NOTE: the tree is reloaded every ttl seconds to forget the tenants deleted
+    # by another wazo-auth, tenants created elsewhere are loaded when first seen
+    def __init__(self, tenant_dao, ttl=None):
         self._tenant_dao = tenant_dao
+        self._ttl = ttl
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._top_tenant_uuid = None
+        self._parents = None
+        self._children = None
+        self._intervals = None
+
+    def add_tenant(self, tenant_uuid, parent_uuid):
+        with self._lock:
+            if self._parents is None:
+                return
+            self._add(str(tenant_uuid), str(parent_uuid))
+
+    def remove_tenant(self, tenant_uuid):
+        tenant_uuid = str(tenant_uuid)
+        with self._lock:
+            if self._parents is None:
+                return
+            parent_uuid = self._parents.pop(tenant_uuid, None)
+            self._children.pop(tenant_uuid, None)
+            siblings = self._children.get(parent_uuid, [])
+            if tenant_uuid in siblings:
+                siblings.remove(tenant_uuid)
+            self._intervals = None
+
+    def is_sub_tenant(self, tenant_uuid, scoping_tenant_uuid):
+        with self._lock:
+            scoping_tenant_uuid = self._find(scoping_tenant_uuid)
+            tenant_uuid = self._find(tenant_uuid)
+            if not scoping_tenant_uuid or not tenant_uuid:
+                return False
+
+            if self._intervals is None:
+                self._number()
+
+            scoping_interval = self._intervals.get(scoping_tenant_uuid)
+            tenant_interval = self._intervals.get(tenant_uuid)
+            if not scoping_interval or not tenant_interval:
+                return False
+
+            left, right = scoping_interval
+            tenant_left, tenant_right = tenant_interval
+            return left <= tenant_left and tenant_right <= right
 
     def list_visible_tenants(self, scoping_tenant_uuid):
-        visible_tenants = self._tenant_dao.list_visible_tenants(scoping_tenant_uuid)
-        return [tenant.uuid for tenant in visible_tenants]
+        with self._lock:
+            scoping_tenant_uuid = self._find(scoping_tenant_uuid)
+            if not scoping_tenant_uuid:
+                return []
+
+            visible_tenants = [scoping_tenant_uuid]
+            for tenant_uuid in visible_tenants:
+                visible_tenants.extend(self._children.get(tenant_uuid, []))
+            return visible_tenants
+
+    def _find(self, tenant_uuid):
+        if self._parents is None or self._expired():
+            self._load()
+
+        if tenant_uuid is None:
+            tenant_uuid = self._top_tenant_uuid
+        tenant_uuid = str(tenant_uuid)
+
+        if tenant_uuid not in self._parents:
+            # NOTE: the tenant could have been created by another wazo-auth
+            if not self._tenant_dao.exists(tenant_uuid):
+                return None
+            self._load()
+
+        return tenant_uuid
+
+    def _expired(self):
+        if self._ttl is None:
+            return False
+        return time.monotonic() - self._loaded_at >= self._ttl
+
+    def _load(self):
+        tenants = self._tenant_dao.list_parents()
+        self._loaded_at = time.monotonic()
+
+        self._top_tenant_uuid = None
+        self._parents = {}
+        self._children = {}
+        for tenant_uuid, parent_uuid in tenants:
+            self._add(tenant_uuid, parent_uuid)
+
+    def _add(self, tenant_uuid, parent_uuid):
+        self._parents[tenant_uuid] = parent_uuid
+        self._intervals = None
+        if tenant_uuid == parent_uuid:
+            self._top_tenant_uuid = tenant_uuid
+            return
+
+        siblings = self._children.setdefault(parent_uuid, [])
+        if tenant_uuid not in siblings:
+            siblings.append(tenant_uuid)
+
+    def _number(self):
+        # Each tenant gets the interval between its entry and its exit of a depth
+        # first walk, a sub-tenant interval is always contained in its parent's
+        self._intervals = {}
+        if not self._top_tenant_uuid:
+            return
+
+        counter = 0
+        stack = [(self._top_tenant_uuid, None)]
+        while stack:
+            tenant_uuid, left = stack.pop()
+            counter += 1
+            if left is not None:
+                self._intervals[tenant_uuid] = left, counter
+                continue
+
+            stack.append((tenant_uuid, counter))
+            for child_uuid in self._children.get(tenant_uuid, []):
+                stack.append((child_uuid, None))
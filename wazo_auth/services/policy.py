@@ -2,14 +2,27 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from wazo_auth import exceptions
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import on_commit
 from wazo_auth.services.helpers import BaseService
 
 
 class PolicyService(BaseService):
+    def __init__(
+        self, dao, tenant_tree, acl_template_cache=None, refresh_token_snapshot=False
+    ):
+        super().__init__(dao, tenant_tree, refresh_token_snapshot)
+        if acl_template_cache is None:
+            acl_template_cache = LRUCache(0)
+        self._acl_template_cache = acl_template_cache
+
     def add_acl_template(self, policy_uuid, acl_template, scoping_tenant_uuid):
         self._assert_in_tenant_subtree(policy_uuid, scoping_tenant_uuid)
 
-        return self._dao.policy.associate_policy_template(policy_uuid, acl_template)
+        result = self._dao.policy.associate_policy_template(policy_uuid, acl_template)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        return result
 
     def assert_policy_in_subtenant(self, scoping_tenant_uuid, uuid):
         tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
@@ -42,7 +55,10 @@ class PolicyService(BaseService):
                 scoping_tenant_uuid
             )
 
-        return self._dao.policy.delete(policy_uuid, **args)
+        result = self._dao.policy.delete(policy_uuid, **args)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        return result
 
     def delete_acl_template(self, policy_uuid, acl_template, scoping_tenant_uuid):
         self._assert_in_tenant_subtree(policy_uuid, scoping_tenant_uuid)
@@ -51,6 +67,8 @@ class PolicyService(BaseService):
             policy_uuid, acl_template
         )
         if nb_deleted:
+            self._bump_snapshot_version()
+            on_commit(self._acl_template_cache.clear)
             return
 
         if not self._dao.policy.exists(policy_uuid):
@@ -87,6 +105,8 @@ class PolicyService(BaseService):
             )
 
         self._dao.policy.update(policy_uuid, **args)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
         return dict(uuid=policy_uuid, **body)
 
     def _assert_in_tenant_subtree(self, policy_uuid, scoping_tenant_uuid):
@@ -1,14 +1,18 @@
 # Copyright 2019-2020 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from functools import partial
+
+from wazo_auth.database.helpers import on_commit
 from wazo_auth.services.helpers import BaseService
 from xivo_bus.resources.auth.events import SessionDeletedEvent
 
 
 class SessionService(BaseService):
-    def __init__(self, dao, tenant_tree, bus_publisher):
+    def __init__(self, dao, tenant_tree, bus_publisher, token_cache):
         super().__init__(dao, tenant_tree)
         self._bus_publisher = bus_publisher
+        self._token_cache = token_cache
 
     def count(self, scoping_tenant_uuid, recurse=False, **kwargs):
         if scoping_tenant_uuid:
@@ -27,13 +31,15 @@ class SessionService(BaseService):
 
     def delete(self, scoping_tenant_uuid, session_uuid):
         tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
-        session, token = self._dao.session.delete(session_uuid, tenant_uuids)
-        if not token:
+        session, tokens = self._dao.session.delete(session_uuid, tenant_uuids)
+        if not tokens:
             return
 
+        for token in tokens:
+            on_commit(partial(self._token_cache.pop, token['uuid']))
         event = SessionDeletedEvent(
             uuid=session['uuid'],
-            user_uuid=token['auth_id'],
+            user_uuid=tokens[0]['auth_id'],
             tenant_uuid=session['tenant_uuid'],
         )
         self._bus_publisher.publish(event)
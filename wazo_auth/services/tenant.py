@@ -3,17 +3,27 @@
 
 from xivo_bus.resources.auth import events
 from wazo_auth import exceptions
+from wazo_auth.database.helpers import on_commit
 from wazo_auth.services.helpers import BaseService
 
 
 class TenantService(BaseService):
-    def __init__(self, dao, tenant_tree, bus_publisher=None):
-        super().__init__(dao, tenant_tree)
+    def __init__(
+        self,
+        dao,
+        tenant_tree,
+        bus_publisher=None,
+        token_cache=None,
+        acl_template_cache=None,
+        refresh_token_snapshot=False,
+    ):
+        super().__init__(dao, tenant_tree, refresh_token_snapshot)
         self._bus_publisher = bus_publisher
+        self._token_cache = token_cache
+        self._acl_template_cache = acl_template_cache
 
     def assert_tenant_under(self, scoping_tenant_uuid, tenant_uuid):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if str(tenant_uuid) not in visible_tenants:
+        if not self.is_sub_tenant(tenant_uuid, scoping_tenant_uuid):
             raise exceptions.UnknownTenantException(tenant_uuid)
 
     def count_policies(self, tenant_uuid, scoping_tenant_uuid, **kwargs):
@@ -32,11 +42,17 @@ class TenantService(BaseService):
         return self._dao.tenant.count(tenant_uuids=visible_tenants, **kwargs)
 
     def delete(self, scoping_tenant_uuid, uuid):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if uuid not in visible_tenants:
-            raise exceptions.UnknownTenantException(uuid)
+        self.assert_tenant_under(scoping_tenant_uuid, uuid)
 
         result = self._dao.tenant.delete(uuid)
+        self._bump_snapshot_version()
+        on_commit(lambda: self._tenant_tree.remove_tenant(uuid))
+        # NOTE: the sessions, users, groups and policies of the tenant have been
+        # deleted by cascade
+        if self._token_cache is not None:
+            on_commit(self._token_cache.clear)
+        if self._acl_template_cache is not None:
+            on_commit(self._acl_template_cache.clear)
 
         event = events.TenantDeletedEvent(uuid)
         self._bus_publisher.publish(event)
@@ -46,9 +62,7 @@ class TenantService(BaseService):
         return self._dao.tenant.find_top_tenant()
 
     def get(self, scoping_tenant_uuid, uuid):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if uuid not in visible_tenants:
-            raise exceptions.UnknownTenantException(uuid)
+        self.assert_tenant_under(scoping_tenant_uuid, uuid)
 
         return self._get(uuid)
 
@@ -69,6 +83,9 @@ class TenantService(BaseService):
     def list_users(self, tenant_uuid, **kwargs):
         return self._dao.user.list_(tenant_uuid=tenant_uuid, **kwargs)
 
+    def is_sub_tenant(self, tenant_uuid, scoping_tenant_uuid):
+        return self._tenant_tree.is_sub_tenant(tenant_uuid, scoping_tenant_uuid)
+
     def list_sub_tenants(self, tenant_uuid):
         return self._tenant_tree.list_visible_tenants(tenant_uuid)
 
@@ -76,6 +93,8 @@ class TenantService(BaseService):
         uuid = self._dao.tenant.create(**kwargs)
         self._dao.address.new(tenant_uuid=uuid, **kwargs['address'])
         result = self._get(uuid)
+        on_commit(lambda: self._tenant_tree.add_tenant(uuid, result['parent_uuid']))
+        self._bump_snapshot_version()
 
         event = events.TenantCreatedEvent(uuid, kwargs.get('name'))
         self._bus_publisher.publish(event)
@@ -83,9 +102,7 @@ class TenantService(BaseService):
         return result
 
     def update(self, scoping_tenant_uuid, tenant_uuid, **kwargs):
-        visible_tenants = self.list_sub_tenants(scoping_tenant_uuid)
-        if tenant_uuid not in visible_tenants:
-            raise exceptions.UnknownTenantException(tenant_uuid)
+        self.assert_tenant_under(scoping_tenant_uuid, tenant_uuid)
 
         address_id = self._dao.tenant.get_address_id(tenant_uuid)
         if not address_id:
@@ -96,6 +113,7 @@ class TenantService(BaseService):
             address_id, self._dao.address.update(address_id, **kwargs['address'])
 
         self._dao.tenant.update(tenant_uuid, **kwargs)
+        self._bump_snapshot_version()
 
         result = self._get(tenant_uuid)
         event = events.TenantUpdatedEvent(tenant_uuid, result.get('name'))
@@ -3,7 +3,7 @@
 
 from unittest import TestCase
 
-from hamcrest import assert_that, contains
+from hamcrest import assert_that, contains, has_entry
 from mock import sentinel as s, Mock
 
 from ..authentication import AuthenticationService
@@ -22,11 +22,13 @@ class TestAuthenticationService(TestCase):
         self.dao.refresh_token.get.return_value = {
             'login': s.original_login,
             'backend_name': s.backend_name,
+            'snapshot': s.snapshot,
         }
 
         result = self.service.verify_auth(args)
 
         assert_that(result, contains(self.backend, s.original_login))
+        assert_that(args, has_entry('refresh_token_snapshot', s.snapshot))
 
     def test_verify_auth_with_login_password(self):
         args = {'backend': s.backend_name, 'login': s.login, 'password': s.password}
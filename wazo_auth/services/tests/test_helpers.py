@@ -0,0 +1,178 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    contains_inanyorder,
+    empty,
+    equal_to,
+    has_entries,
+    raises,
+)
+from mock import Mock, patch
+
+from wazo_auth import exceptions
+from ..helpers import LoginContext, TenantTree
+
+TOP = 'top'
+
+#         top
+#       /  |  \
+#      a   e   h
+#     / \  |
+#    d   b f
+#       / \
+#      g   c
+TENANTS = [
+    (TOP, TOP),
+    ('a', TOP),
+    ('e', TOP),
+    ('h', TOP),
+    ('d', 'a'),
+    ('b', 'a'),
+    ('f', 'e'),
+    ('g', 'b'),
+    ('c', 'b'),
+]
+
+
+class TestTenantTree(TestCase):
+    def setUp(self):
+        self.tenant_dao = Mock()
+        self.tenant_dao.list_parents.return_value = list(TENANTS)
+        self.tenant_dao.exists.return_value = False
+
+        self.tree = TenantTree(self.tenant_dao)
+
+    def test_list_visible_tenants(self):
+        all_tenants = [uuid for uuid, _ in TENANTS]
+
+        result = self.tree.list_visible_tenants(None)
+        assert_that(result, contains_inanyorder(*all_tenants))
+
+        result = self.tree.list_visible_tenants(TOP)
+        assert_that(result, contains_inanyorder(*all_tenants))
+
+        result = self.tree.list_visible_tenants('c')
+        assert_that(result, contains('c'))
+
+        result = self.tree.list_visible_tenants('a')
+        assert_that(result, contains_inanyorder('a', 'b', 'c', 'd', 'g'))
+
+        result = self.tree.list_visible_tenants('unknown')
+        assert_that(result, empty())
+
+        self.tenant_dao.list_parents.assert_called_once_with()
+
+    def test_is_sub_tenant(self):
+        for tenant_uuid, _ in TENANTS:
+            assert_that(self.tree.is_sub_tenant(tenant_uuid, TOP), equal_to(True))
+            assert_that(self.tree.is_sub_tenant(tenant_uuid, None), equal_to(True))
+            assert_that(
+                self.tree.is_sub_tenant(tenant_uuid, tenant_uuid), equal_to(True)
+            )
+
+        assert_that(self.tree.is_sub_tenant('g', 'a'), equal_to(True))
+        assert_that(self.tree.is_sub_tenant('c', 'b'), equal_to(True))
+        assert_that(self.tree.is_sub_tenant('a', 'b'), equal_to(False))
+        assert_that(self.tree.is_sub_tenant('f', 'a'), equal_to(False))
+        assert_that(self.tree.is_sub_tenant('g', 'c'), equal_to(False))
+        assert_that(self.tree.is_sub_tenant(TOP, 'h'), equal_to(False))
+        assert_that(self.tree.is_sub_tenant('unknown', TOP), equal_to(False))
+        assert_that(self.tree.is_sub_tenant('a', 'unknown'), equal_to(False))
+
+    def test_add_and_remove_tenant(self):
+        self.tree.list_visible_tenants(TOP)
+
+        self.tree.add_tenant('i', 'c')
+        result = self.tree.list_visible_tenants('b')
+        assert_that(result, contains_inanyorder('b', 'c', 'g', 'i'))
+        assert_that(self.tree.is_sub_tenant('i', 'a'), equal_to(True))
+
+        self.tree.remove_tenant('i')
+        result = self.tree.list_visible_tenants('b')
+        assert_that(result, contains_inanyorder('b', 'c', 'g'))
+        assert_that(self.tree.is_sub_tenant('i', 'a'), equal_to(False))
+
+        self.tenant_dao.list_parents.assert_called_once_with()
+
+    def test_unknown_tenant_created_elsewhere_reloads(self):
+        self.tree.list_visible_tenants(TOP)
+        self.tenant_dao.list_parents.return_value = TENANTS + [('i', 'h')]
+        self.tenant_dao.exists.return_value = True
+
+        result = self.tree.list_visible_tenants('i')
+
+        assert_that(result, contains('i'))
+        assert_that(self.tree.list_visible_tenants('h'), contains('h', 'i'))
+
+    @patch('wazo_auth.services.helpers.time.monotonic')
+    def test_tenant_deleted_elsewhere_forgotten_after_ttl(self, monotonic):
+        monotonic.return_value = 1000
+        tree = TenantTree(self.tenant_dao, ttl=60)
+        tree.list_visible_tenants(TOP)
+        self.tenant_dao.list_parents.return_value = [
+            tenant for tenant in TENANTS if tenant[0] != 'c'
+        ]
+
+        monotonic.return_value = 1059
+        assert_that(tree.list_visible_tenants('b'), contains_inanyorder('b', 'c', 'g'))
+
+        monotonic.return_value = 1060
+        assert_that(tree.list_visible_tenants('b'), contains_inanyorder('b', 'g'))
+        assert_that(tree.is_sub_tenant('c', TOP), equal_to(False))
+
+
+class TestLoginContext(TestCase):
+    def setUp(self):
+        self.dao = Mock()
+        self.dao.user.get_by_username.return_value = {
+            'uuid': 'user-uuid',
+            'tenant_uuid': 'a',
+            'purpose': 'user',
+        }
+        self.dao.group.list_with_members.return_value = [
+            {'uuid': 'group-uuid', 'name': 'group', 'users': [{'uuid': 'user-uuid'}]}
+        ]
+        self.dao.tenant.list_.return_value = [
+            {'uuid': 'b', 'name': 'B'},
+            {'uuid': 'a', 'name': 'A'},
+        ]
+        self.dao.policy.list_acl_templates_of_user.return_value = {
+            'user': ['user.#'],
+            'groups': ['group.#'],
+        }
+        self.tenant_tree = Mock()
+        self.tenant_tree.list_visible_tenants.return_value = ['a', 'b']
+
+        self.context = LoginContext(self.dao, self.tenant_tree, 'alice')
+
+    def test_loaded_once(self):
+        for _ in range(3):
+            assert_that(self.context.user, has_entries(uuid='user-uuid'))
+            assert_that(self.context.groups, contains(has_entries(name='group')))
+            assert_that(self.context.tenant, has_entries(uuid='a', name='A'))
+            assert_that(
+                self.context.acl_templates,
+                has_entries(user=contains('user.#'), groups=contains('group.#')),
+            )
+
+        self.dao.user.get_by_username.assert_called_once_with('alice')
+        self.dao.group.list_with_members.assert_called_once_with('user-uuid')
+        self.tenant_tree.list_visible_tenants.assert_called_once_with('a')
+        self.dao.tenant.list_.assert_called_once_with(tenant_uuids=['a', 'b'])
+        self.dao.policy.list_acl_templates_of_user.assert_called_once_with('user-uuid')
+
+    def test_unknown_login(self):
+        self.dao.user.get_by_username.side_effect = exceptions.UnknownUsernameException(
+            'alice'
+        )
+
+        assert_that(
+            calling(getattr).with_args(self.context, 'user'),
+            raises(exceptions.UnknownUsernameException),
+        )
@@ -4,6 +4,7 @@
 import time
 import logging
 
+from functools import partial
 from xivo_bus.resources.auth.events import (
     RefreshTokenCreatedEvent,
     RefreshTokenDeletedEvent,
@@ -11,6 +12,7 @@ from xivo_bus.resources.auth.events import (
     SessionDeletedEvent,
 )
 
+from wazo_auth.database.helpers import on_commit
 from wazo_auth.token import Token
 from wazo_auth.services.helpers import BaseService
 
@@ -24,11 +26,16 @@ logger = logging.getLogger(__name__)
 
 
 class TokenService(BaseService):
-    def __init__(self, config, dao, tenant_tree, bus_publisher):
+    def __init__(
+        self, config, dao, tenant_tree, bus_publisher, token_cache, timer_wheel=None
+    ):
         super().__init__(dao, tenant_tree)
         self._backend_policies = config.get('backend_policies', {})
         self._default_expiration = config['default_token_lifetime']
+        self._refresh_token_snapshot = config['refresh_token_snapshot']
         self._bus_publisher = bus_publisher
+        self._token_cache = token_cache
+        self._timer_wheel = timer_wheel
 
     def count_refresh_tokens(
         self, scoping_tenant_uuid=None, recurse=False, **search_params
@@ -63,17 +70,25 @@ class TokenService(BaseService):
         return self._dao.refresh_token.list_(**search_params)
 
     def new_token(self, backend, login, args):
-        metadata = backend.get_metadata(login, args)
-        logger.debug('metadata for %s: %s', login, metadata)
+        snapshot_version = self._get_snapshot_version(args)
+        snapshot = args.get('refresh_token_snapshot')
+        if snapshot and snapshot['version'] == snapshot_version:
+            logger.debug('reusing the refresh token snapshot for %s', login)
+            metadata = snapshot['metadata']
+            acls = snapshot['acls']
+        else:
+            snapshot = None
+            metadata = backend.get_metadata(login, args)
+            logger.debug('metadata for %s: %s', login, metadata)
+
+            args['acl_templates'] = self._get_acl_templates(args['backend'])
+            args['metadata'] = metadata
+
+            acls = backend.get_acls(login, args)
 
         auth_id = metadata['auth_id']
         pbx_user_uuid = metadata.get('pbx_user_uuid')
         xivo_uuid = metadata['xivo_uuid']
-
-        args['acl_templates'] = self._get_acl_templates(args['backend'])
-        args['metadata'] = metadata
-
-        acls = backend.get_acls(login, args)
         expiration = args.get('expiration', self._default_expiration)
         current_time = time.time()
 
@@ -118,16 +133,30 @@ class TokenService(BaseService):
                 self._bus_publisher.publish(event)
             token_payload['refresh_token'] = refresh_token
 
+        refresh_token = token_payload.get('refresh_token') or args.get('refresh_token')
+        if snapshot_version is not None and not snapshot and refresh_token:
+            self._dao.refresh_token.update_snapshot(
+                refresh_token, snapshot_version, metadata, token_payload['acls']
+            )
+
         token_uuid, session_uuid = self._dao.token.create(
             token_payload, session_payload
         )
         token = Token(token_uuid, session_uuid=session_uuid, **token_payload)
+        self._schedule_expiration(token)
 
         event = SessionCreatedEvent(session_uuid, user_uuid=auth_id, **session_payload)
         self._bus_publisher.publish(event)
 
         return token
 
+    def _get_snapshot_version(self, args):
+        if not self._refresh_token_snapshot:
+            return None
+
+        if args.get('refresh_token') or args.get('access_type') == 'offline':
+            return self._dao.refresh_token.get_snapshot_version()
+
     def _get_tenant_list(self, tenant_uuid):
         if not tenant_uuid:
             return []
@@ -136,6 +165,9 @@ class TokenService(BaseService):
         return [{'uuid': uuid} for uuid in tenant_uuids]
 
     def remove_token(self, token_uuid):
+        on_commit(partial(self._token_cache.pop, token_uuid))
+        if self._timer_wheel is not None:
+            self._timer_wheel.discard(token_uuid)
         token, session = self._dao.token.delete(token_uuid)
         if not session:
             return
@@ -148,12 +180,7 @@ class TokenService(BaseService):
         self._bus_publisher.publish(event)
 
     def get(self, token_uuid, required_acl):
-        token_data = self._dao.token.get(token_uuid)
-        if not token_data:
-            raise UnknownTokenException()
-
-        id_ = token_data.pop('uuid')
-        token = Token(id_, **token_data)
+        token = self._get_token(token_uuid)
 
         if token.is_expired():
             raise UnknownTokenException()
@@ -163,6 +190,41 @@ class TokenService(BaseService):
 
         return token
 
+    def get_many(self, token_uuids):
+        tokens = []
+        missing_token_uuids = []
+        for token_uuid in set(token_uuids):
+            token = self._token_cache.get(token_uuid)
+            if token:
+                tokens.append(token)
+            else:
+                missing_token_uuids.append(token_uuid)
+
+        for token_data in self._dao.token.get_many(missing_token_uuids):
+            tokens.append(self._cache_token(token_data))
+
+        return {token.token: token for token in tokens if not token.is_expired()}
+
+    def _get_token(self, token_uuid):
+        token = self._token_cache.get(token_uuid)
+        if token:
+            return token
+
+        token_data = self._dao.token.get(token_uuid)
+        return self._cache_token(token_data)
+
+    def _cache_token(self, token_data):
+        token_data = dict(token_data)
+        id_ = token_data.pop('uuid')
+        token = Token(id_, **token_data)
+        self._token_cache.set(id_, token, expire_at=token.expire_t)
+        self._schedule_expiration(token)
+        return token
+
+    def _schedule_expiration(self, token):
+        if self._timer_wheel is not None and token.expire_t:
+            self._timer_wheel.add(token.token, token.expire_t)
+
     def _get_acl_templates(self, backend_name):
         policy_name = self._backend_policies.get(backend_name)
         if not policy_name:
@@ -3,29 +3,55 @@
 
 import binascii
 import hashlib
+import hmac
 import logging
 import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from xivo.status import Status
 
 from wazo_auth import exceptions
-from wazo_auth.services.helpers import BaseService
+from wazo_auth.cache import LRUCache
+from wazo_auth.database.helpers import on_commit
+from wazo_auth.services.helpers import BaseService, LoginContext
 
 logger = logging.getLogger(__name__)
 
 
 class UserService(BaseService):
-    def __init__(self, dao, tenant_tree, encrypter=None):
-        super().__init__(dao, tenant_tree)
+    def __init__(
+        self,
+        dao,
+        tenant_tree,
+        encrypter=None,
+        acl_template_cache=None,
+        user_cache=None,
+        refresh_token_snapshot=False,
+    ):
+        super().__init__(dao, tenant_tree, refresh_token_snapshot)
         self._encrypter = encrypter or PasswordEncrypter()
+        if acl_template_cache is None:
+            acl_template_cache = LRUCache(0)
+        self._acl_template_cache = acl_template_cache
+        if user_cache is None:
+            user_cache = LRUCache(0)
+        self._user_cache = user_cache
 
     def add_policy(self, user_uuid, policy_uuid):
         self._dao.user.add_policy(user_uuid, policy_uuid)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
 
     def change_password(self, user_uuid, old_password, new_password, reset=False):
         user = self.get_user(user_uuid)
         if not self.verify_password(user['username'], old_password, reset):
             raise exceptions.AuthenticationFailedException()
 
-        salt, hash_ = self._encrypter.encrypt_password(new_password)
+        salt, hash_ = self._encrypter.encrypt_password(
+            new_password, user.get('purpose')
+        )
         self._dao.user.change_password(user_uuid, salt, hash_)
 
     def delete_password(self, **kwargs):
@@ -64,15 +90,37 @@ class UserService(BaseService):
     def delete_user(self, scoping_tenant_uuid, user_uuid):
         self.assert_user_in_subtenant(scoping_tenant_uuid, user_uuid)
         self._dao.user.delete(user_uuid)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        on_commit(self._user_cache.clear)
+
+    def get_acl_templates(self, username, login_context=None):
+        cache_key = ('users', username)
+        acl_templates = self._acl_template_cache.get(cache_key)
+        if acl_templates is not None:
+            return list(acl_templates)
+
+        if login_context is None:
+            login_context = LoginContext(
+                self._dao, self._tenant_tree, username, self.get_user_by_username
+            )
 
-    def get_acl_templates(self, username):
-        users = self._dao.user.list_(username=username, limit=1)
-        acl_templates = []
-        for user in users:
-            policies = self.list_policies(user['uuid'])
-            for policy in policies:
-                acl_templates.extend(policy['acl_templates'])
-        return acl_templates
+        try:
+            acl_templates = login_context.acl_templates['user']
+        except exceptions.UnknownUsernameException:
+            return []
+
+        self._acl_template_cache.set(cache_key, list(acl_templates))
+        return list(acl_templates)
+
+    def get_login_context(self, login, args):
+        context = args.get('login_context')
+        if context is None or context.login != login:
+            context = LoginContext(
+                self._dao, self._tenant_tree, login, self.get_user_by_username
+            )
+            args['login_context'] = context
+        return context
 
     def get_user(self, user_uuid, scoping_tenant_uuid=None):
         if scoping_tenant_uuid:
@@ -83,6 +131,13 @@ class UserService(BaseService):
             return user
         raise exceptions.UnknownUserException(user_uuid)
 
+    def get_user_by_username(self, username):
+        user = self._user_cache.get(username)
+        if user is None:
+            user = self._dao.user.get_by_username(username)
+            self._user_cache.set(username, user)
+        return dict(user)
+
     def list_groups(self, user_uuid, **kwargs):
         return self._dao.group.list_(user_uuid=user_uuid, **kwargs)
 
@@ -111,7 +166,9 @@ class UserService(BaseService):
             'creating a new user with params: %s', kwargs
         )  # log after poping the password
         if password:
-            kwargs['salt'], kwargs['hash_'] = self._encrypter.encrypt_password(password)
+            kwargs['salt'], kwargs['hash_'] = self._encrypter.encrypt_password(
+                password, kwargs.get('purpose')
+            )
 
         kwargs.setdefault('tenant_uuid', self._dao.tenant.find_top_tenant())
         user = self._dao.user.create(**kwargs)
@@ -121,6 +178,8 @@ class UserService(BaseService):
     def remove_policy(self, user_uuid, policy_uuid):
         nb_deleted = self._dao.user.remove_policy(user_uuid, policy_uuid)
         if nb_deleted:
+            self._bump_snapshot_version()
+            on_commit(self._acl_template_cache.clear)
             return
 
         if not self._dao.user.exists(user_uuid):
@@ -132,29 +191,44 @@ class UserService(BaseService):
     def update(self, scoping_tenant_uuid, user_uuid, **kwargs):
         self.assert_user_in_subtenant(scoping_tenant_uuid, user_uuid)
         self._dao.user.update(user_uuid, **kwargs)
+        self._bump_snapshot_version()
+        on_commit(self._acl_template_cache.clear)
+        on_commit(self._user_cache.clear)
         return self.get_user(user_uuid)
 
     def update_emails(self, user_uuid, emails):
         return self._dao.user.update_emails(user_uuid, emails)
 
+    def is_sub_tenant(self, tenant_uuid, scoping_tenant_uuid):
+        return self._tenant_tree.is_sub_tenant(tenant_uuid, scoping_tenant_uuid)
+
     def user_has_sub_tenant(self, user_uuid, tenant_uuid):
         user = self.get_user(user_uuid)
-        visible_tenants = self._tenant_tree.list_visible_tenants(user['tenant_uuid'])
-        return tenant_uuid in visible_tenants
+        return self.is_sub_tenant(tenant_uuid, user['tenant_uuid'])
 
     def verify_password(self, username, password, reset=False):
         if reset:
             return True
 
         try:
-            hash_, salt = self._dao.user.get_credentials(username)
+            credentials = self._dao.user.get_login_credentials(username)
         except exceptions.UnknownUsernameException:
             return False
 
+        hash_, salt = credentials['password_hash'], credentials['password_salt']
         if not hash_ or not salt:
             return False
 
-        return hash_ == self._encrypter.compute_password_hash(password, salt)
+        if not self._encrypter.verify_password(password, salt, hash_):
+            return False
+
+        purpose = credentials['purpose']
+        if self._encrypter.needs_update(hash_, purpose):
+            logger.debug('updating the password hash parameters of %s', username)
+            salt, hash_ = self._encrypter.encrypt_password(password, purpose)
+            self._dao.user.change_password(credentials['uuid'], salt, hash_)
+
+        return True
 
     def assert_user_in_subtenant(self, scoping_tenant_uuid, user_uuid):
         tenant_uuids = self._tenant_tree.list_visible_tenants(scoping_tenant_uuid)
@@ -163,20 +237,151 @@ class UserService(BaseService):
             raise exceptions.UnknownUserException(user_uuid)
 
 
+class PasswordHashingExecutor:
+    def __init__(self, max_workers, max_queue_size, max_http_threads=None):
+        if max_http_threads is not None:
+            # NOTE: callers wait for their hash on an HTTP thread, keep half of those
+            # threads for the other requests (token validations, ...)
+            max_admitted = max(1, max_http_threads // 2)
+            if max_workers + max_queue_size > max_admitted:
+                logger.warning(
+                    'password_hashing: limited to %s of the %s HTTP threads',
+                    max_admitted,
+                    max_http_threads,
+                )
+                max_workers = min(max_workers, max_admitted)
+                max_queue_size = max_admitted - max_workers
+
+        self._max_workers = max_workers
+        self._max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='password-hashing'
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+        self._lock = threading.Lock()
+        self._in_progress = 0
+        self._rejected = 0
+        self._completed = 0
+        self._total_wait_time = 0.0
+        self._total_hash_time = 0.0
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise exceptions.PasswordHashingOverloadedException()
+
+        with self._lock:
+            self._in_progress += 1
+
+        try:
+            future = self._executor.submit(self._run, time.monotonic(), fn, *args)
+        except Exception:
+            self._done()
+            raise
+
+        return future.result()
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['password_hashing']['max_workers'],
+            config['password_hashing']['max_queue_size'],
+            config['rest_api']['max_threads'],
+        )
+
+    def provide_status(self, status):
+        with self._lock:
+            completed = self._completed
+            status['password_hashing'] = {
+                'status': Status.ok,
+                'max_workers': self._max_workers,
+                'max_queue_size': self._max_queue_size,
+                'in_progress': self._in_progress,
+                'rejected': self._rejected,
+                'completed': completed,
+                'average_wait_time': self._total_wait_time / completed
+                if completed
+                else None,
+                'average_hash_time': self._total_hash_time / completed
+                if completed
+                else None,
+            }
+
+    def _run(self, submitted_at, fn, *args):
+        started_at = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.monotonic()
+            self._done(started_at - submitted_at, finished_at - started_at)
+
+    def _done(self, wait_time=None, hash_time=None):
+        with self._lock:
+            self._in_progress -= 1
+            if hash_time is not None:
+                self._completed += 1
+                self._total_wait_time += wait_time
+                self._total_hash_time += hash_time
+        self._slots.release()
+
+
 class PasswordEncrypter:
 
     _salt_len = 64
     _hash_algo = 'sha512'
     _iterations = 250000
+    _scheme_prefix = 'pbkdf2_'
+
+    def __init__(self, executor=None, iterations=None):
+        self._executor = executor
+        self._purpose_iterations = iterations or {}
 
-    def encrypt_password(self, password):
+    def encrypt_password(self, password, purpose=None):
         salt = os.urandom(self._salt_len)
-        hash_ = self.compute_password_hash(password, salt)
-        return salt, hash_
+        iterations = self._get_iterations(purpose)
+        hash_ = self.compute_password_hash(password, salt, self._hash_algo, iterations)
+        return salt, self._format_hash(self._hash_algo, iterations, hash_)
+
+    def verify_password(self, password, salt, password_hash):
+        hash_algo, iterations, expected_hash = self._parse_hash(password_hash)
+        hash_ = self.compute_password_hash(password, salt, hash_algo, iterations)
+        return hmac.compare_digest(hash_, expected_hash)
+
+    def needs_update(self, password_hash, purpose=None):
+        hash_algo, iterations, _ = self._parse_hash(password_hash)
+        return (hash_algo, iterations) != (
+            self._hash_algo,
+            self._get_iterations(purpose),
+        )
+
+    def compute_password_hash(self, password, salt, hash_algo=None, iterations=None):
+        hash_algo = hash_algo or self._hash_algo
+        iterations = iterations or self._iterations
+        if self._executor:
+            return self._executor.run(
+                self._compute_password_hash, password, salt, hash_algo, iterations
+            )
+        return self._compute_password_hash(password, salt, hash_algo, iterations)
 
-    def compute_password_hash(self, password, salt):
+    def _compute_password_hash(self, password, salt, hash_algo, iterations):
         password_bytes = password.encode('utf-8')
-        dk = hashlib.pbkdf2_hmac(
-            self._hash_algo, password_bytes, salt, self._iterations
-        )
+        dk = hashlib.pbkdf2_hmac(hash_algo, password_bytes, salt, iterations)
         return binascii.hexlify(dk).decode('utf-8')
+
+    def _get_iterations(self, purpose):
+        return self._purpose_iterations.get(purpose) or self._iterations
+
+    def _format_hash(self, hash_algo, iterations, hash_):
+        return '{}{}${}${}'.format(self._scheme_prefix, hash_algo, iterations, hash_)
+
+    def _parse_hash(self, password_hash):
+        # NOTE: hashes created before the parameters were stored are bare hex digests
+        if not password_hash.startswith(self._scheme_prefix):
+            return self._hash_algo, self._iterations, password_hash
+
+        scheme, iterations, hash_ = password_hash.split('$', 2)
+        return scheme[len(self._scheme_prefix) :], int(iterations), hash_
@@ -0,0 +1,58 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, none
+
+from ..cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_unknown_key(self):
+        cache = LRUCache(2)
+
+        assert_that(cache.get('unknown'), none())
+        assert_that(cache.get('unknown', 'default'), equal_to('default'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(2)
+        cache.set('one', 1)
+        cache.set('two', 2)
+        cache.get('one')
+
+        cache.set('three', 3)
+
+        assert_that(cache.get('one'), equal_to(1))
+        assert_that(cache.get('two'), none())
+        assert_that(cache.get('three'), equal_to(3))
+
+    def test_pop(self):
+        cache = LRUCache(2)
+        cache.set('one', 1)
+
+        assert_that(cache.pop('one'), equal_to(1))
+        assert_that(cache.get('one'), none())
+        assert_that(cache.pop('one'), none())
+
+    def test_disabled_when_max_size_is_zero(self):
+        cache = LRUCache(0)
+        cache.set('one', 1)
+
+        assert_that(cache.get('one'), none())
+        assert_that(len(cache), equal_to(0))
+
+    def test_entries_expire(self):
+        cache = LRUCache(2)
+        cache.set('expired', 1, expire_at=time.time() - 1)
+        cache.set('valid', 2, expire_at=time.time() + 60)
+
+        assert_that(cache.get('expired'), none())
+        assert_that(cache.get('valid'), equal_to(2))
+
+    def test_ttl_caps_the_expiration(self):
+        cache = LRUCache(2, ttl=-1)
+        cache.set('one', 1, expire_at=time.time() + 60)
+
+        assert_that(cache.get('one'), none())
@@ -0,0 +1,164 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import socket
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import TestCase
+
+from hamcrest import assert_that, contains, empty, equal_to, has_entries, has_length
+from mock import Mock
+
+from ..cache import LRUCache
+from ..confd import UserDataFetcher
+
+USER_UUID = '2c0a3a5c-6a7d-4ef0-9a9e-5e6b2b3f0c71'
+USER = {
+    'id': 42,
+    'uuid': USER_UUID,
+    'tenant_uuid': 'a26c4ed8-767f-463e-a10a-42c4f220d375',
+    'voicemail': {'id': 3},
+    'lines': [
+        {
+            'id': 1,
+            'endpoint_sip': {'id': 10},
+            'endpoint_sccp': None,
+            'endpoint_custom': None,
+            'extensions': [{'id': 100}],
+        },
+        {
+            'id': 2,
+            'endpoint_sip': None,
+            'endpoint_sccp': None,
+            'endpoint_custom': {'id': 20},
+            'extensions': [],
+        },
+    ],
+    'agent': {'id': 5},
+}
+
+
+class _ConfdServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ConfdHandler)
+        self.requests = []
+
+
+class _ConfdHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(
+            (self.path, self.headers.get('X-Auth-Token'), self.client_address)
+        )
+        if self.path == '/1.1/users/{}'.format(USER_UUID):
+            status, body = 200, USER
+        else:
+            status, body = 404, {'message': 'Resource Not Found'}
+
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestUserDataFetcher(TestCase):
+    def setUp(self):
+        self.server = _ConfdServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+        self.local_token_renewer = Mock()
+        self.local_token_renewer.get_token.return_value = 'local-token'
+        self.config = {
+            'confd': {
+                'host': '127.0.0.1',
+                'port': self.server.server_address[1],
+                'https': False,
+            },
+            'local_token_renewer': self.local_token_renewer,
+        }
+        self.fetcher = UserDataFetcher(self.config, cache=LRUCache(10))
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_get_user_data(self):
+        result = self.fetcher.get_user_data(USER_UUID)
+
+        assert_that(
+            result,
+            has_entries(
+                id=42,
+                uuid=USER_UUID,
+                voicemails=contains(3),
+                lines=contains(1, 2),
+                extensions=contains(100),
+                endpoint_sip=contains(10),
+                endpoint_sccp=empty(),
+                endpoint_custom=contains(20),
+                agent={'id': 5},
+            ),
+        )
+        path, token, _ = self.server.requests[0]
+        assert_that(path, equal_to('/1.1/users/{}'.format(USER_UUID)))
+        assert_that(token, equal_to('local-token'))
+
+    def test_get_user_data_is_cached(self):
+        first = self.fetcher.get_user_data(USER_UUID)
+        first['lines'] = 'modified'
+        second = self.fetcher.get_user_data(USER_UUID)
+
+        assert_that(second, has_entries(lines=contains(1, 2)))
+        assert_that(self.server.requests, has_length(1))
+
+    def test_connection_is_reused(self):
+        self.fetcher.get_user_data(USER_UUID)
+        self.fetcher.get_user_data('unknown')
+        self.fetcher.get_user_data('other-unknown')
+
+        client_addresses = set(address for _, _, address in self.server.requests)
+        assert_that(self.server.requests, has_length(3))
+        assert_that(client_addresses, has_length(1))
+
+    def test_unknown_user(self):
+        assert_that(self.fetcher.get_user_data('unknown'), equal_to({}))
+        assert_that(self.fetcher.get_user_data('unknown'), equal_to({}))
+
+        assert_that(self.server.requests, has_length(2))
+
+    def test_no_token(self):
+        self.local_token_renewer.get_token.return_value = None
+
+        assert_that(self.fetcher.get_user_data(USER_UUID), equal_to({}))
+        assert_that(self.fetcher.get_user_data(None), equal_to({}))
+
+        assert_that(self.server.requests, empty())
+
+    def test_confd_unreachable(self):
+        unused_socket = socket.socket()
+        unused_socket.bind(('127.0.0.1', 0))
+        unused_port = unused_socket.getsockname()[1]
+        unused_socket.close()
+        self.config['confd']['port'] = unused_port
+        fetcher = UserDataFetcher(self.config)
+
+        try:
+            assert_that(fetcher.get_user_data(USER_UUID), equal_to({}))
+        finally:
+            fetcher.close()
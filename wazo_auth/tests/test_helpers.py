@@ -1,13 +1,46 @@
 # Copyright 2017-2019 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import importlib.util
+import os
+import time
 import unittest
 
-from hamcrest import assert_that, contains_inanyorder, empty, equal_to
-from mock import Mock
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_inanyorder,
+    empty,
+    equal_to,
+    less_than_or_equal_to,
+    raises,
+)
+from jinja2 import Template
+from mock import Mock, patch
 
 from ..helpers import LazyTemplateRenderer, LocalTokenRenewer
 
+DEFAULT_USER_POLICY_MIGRATION = os.path.join(
+    os.path.dirname(__file__),
+    '..',
+    '..',
+    'alembic',
+    'versions',
+    '12a91e0863f5_create_the_default_user_policy.py',
+)
+
+
+def _load_default_user_acl_templates():
+    spec = importlib.util.spec_from_file_location(
+        'default_user_policy', DEFAULT_USER_POLICY_MIGRATION
+    )
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration.DEFAULT_USER_ACL_TEMPLATES
+
+
+DEFAULT_USER_ACL_TEMPLATES = _load_default_user_acl_templates()
+
 
 class TestLazyTemplateRenderer(unittest.TestCase):
     def test_render_no_templates(self):
@@ -40,6 +73,21 @@ class TestLazyTemplateRenderer(unittest.TestCase):
         expected = ['confd.lines.1.#', 'confd.lines.42.#', 'dird.me.#']
         assert_that(acls, contains_inanyorder(*expected))
 
+    def test_templates_are_compiled_once(self):
+        templates = DEFAULT_USER_ACL_TEMPLATES + [
+            'auth.users.{{ uuid }}.password.edit',
+            'events.auth.users.{{ uuid }}.external.#',
+            '{% if agent %}agentd.agents.by-id.{{ agent.id }}.read{% endif %}',
+        ]
+        metadata = {'uuid': '08b213da-9963-4d25-96a3-f02d717e82f2', 'agent': None}
+
+        with patch('wazo_auth.helpers.Template', wraps=Template) as template_class:
+            for _ in range(10):
+                acls = LazyTemplateRenderer(templates, None, metadata=metadata).render()
+
+        assert_that(template_class.call_count, less_than_or_equal_to(3))
+        assert_that(len(acls), equal_to(len(DEFAULT_USER_ACL_TEMPLATES) + 2))
+
 
 class TestLocalTokenRenewer(unittest.TestCase):
     def setUp(self):
@@ -91,3 +139,67 @@ class TestLocalTokenRenewer(unittest.TestCase):
         self.local_token_renewer.revoke_token()
 
         self._token_service.remove_token.assert_called_once_with(token)
+
+    def test_background_renewal(self):
+        tokens = [Mock(token='first'), Mock(token='second')]
+        self._token_service.new_token.side_effect = tokens + [Mock(token='next')] * 10
+        self.local_token_renewer._delay = self.local_token_renewer._threshold + 0.1
+
+        self.local_token_renewer.start()
+        try:
+            assert_that(self.local_token_renewer.get_token(), equal_to('first'))
+
+            deadline = time.time() + 5
+            while self.local_token_renewer.get_token() == 'first':
+                assert_that(time.time(), less_than_or_equal_to(deadline))
+                time.sleep(0.01)
+        finally:
+            self.local_token_renewer.stop()
+
+    def test_get_token_does_not_renew_when_started(self):
+        self.local_token_renewer.start()
+        try:
+            for _ in range(10):
+                self.local_token_renewer.get_token()
+        finally:
+            self.local_token_renewer.stop()
+
+        self._token_service.new_token.assert_called_once()
+
+    def test_background_renewal_retries_on_error(self):
+        self._token_service.new_token.side_effect = [
+            Exception('database unavailable'),
+            Mock(token='token'),
+        ]
+        self.local_token_renewer._retry_interval = 0.01
+
+        self.local_token_renewer.start()
+        try:
+            deadline = time.time() + 5
+            while self.local_token_renewer.get_token() is None:
+                assert_that(time.time(), less_than_or_equal_to(deadline))
+                time.sleep(0.01)
+        finally:
+            self.local_token_renewer.stop()
+
+        assert_that(self.local_token_renewer.get_token(), equal_to('token'))
+
+    @patch('wazo_auth.helpers.Session')
+    def test_renew_rolls_back_and_closes_the_session_on_error(self, session):
+        self._token_service.new_token.side_effect = Exception('database unavailable')
+
+        assert_that(
+            calling(self.local_token_renewer._renew), raises(Exception),
+        )
+
+        session.rollback.assert_called_once_with()
+        session.close.assert_called_once_with()
+
+    @patch('wazo_auth.helpers.Session')
+    def test_renew_closes_the_session(self, session):
+        self._user_service.list_users.return_value = []
+
+        self.local_token_renewer._renew()
+
+        session.rollback.assert_not_called()
+        session.close.assert_called_once_with()
@@ -0,0 +1,136 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import assert_that, calling, equal_to, has_entries, raises
+from mock import ANY, Mock, patch
+from sqlalchemy.pool import NullPool
+
+from ..leader_election import ACQUIRE_QUERY, LEADER_QUERY, AdvisoryLockLeaderElection
+
+LOCK_ID = 42
+
+
+class TestAdvisoryLockLeaderElection(TestCase):
+    def setUp(self):
+        session_patcher = patch('wazo_auth.leader_election.Session')
+        session_patcher.start()
+        self.addCleanup(session_patcher.stop)
+        engine_patcher = patch('wazo_auth.leader_election.create_engine')
+        self.create_engine = engine_patcher.start()
+        self.addCleanup(engine_patcher.stop)
+
+        self.connection = Mock()
+        self.connect = self.create_engine.return_value.connect
+        self.connect.return_value.execution_options.return_value = self.connection
+        self.leader_election = AdvisoryLockLeaderElection(LOCK_ID, 'node-1')
+
+    def test_elect_leader(self):
+        self._set_leader('node-1', is_self=True)
+
+        assert_that(self.leader_election.elect(), equal_to(True))
+        assert_that(self._status(), has_entries(leader='node-1', is_leader=True))
+
+    def test_elect_follower(self):
+        self._set_leader('node-2', is_self=False)
+
+        assert_that(self.leader_election.elect(), equal_to(False))
+        assert_that(self._status(), has_entries(leader='node-2', is_leader=False))
+
+    def test_leader_does_not_acquire_again(self):
+        self._set_leader('node-1', is_self=True)
+
+        self.leader_election.elect()
+        self.leader_election.elect()
+
+        acquires = [
+            call
+            for call in self.connection.execute.call_args_list
+            if call[0][0] is ACQUIRE_QUERY
+        ]
+        assert_that(len(acquires), equal_to(1))
+
+    def test_connection_lost(self):
+        self._set_leader('node-1', is_self=True)
+        self.leader_election.elect()
+
+        self.connection.execute.side_effect = Exception('connection lost')
+
+        assert_that(self.leader_election.elect(), equal_to(False))
+        assert_that(self._status(), has_entries(leader=None, is_leader=False))
+        self.connection.invalidate.assert_called_once_with()
+        self.connection.close.assert_called_once_with()
+
+    def test_elected_again_after_a_failure(self):
+        self._set_leader('node-1', is_self=True)
+        self.connection.execute.side_effect = [Exception('connection lost')]
+        assert_that(self.leader_election.elect(), equal_to(False))
+
+        self.connection.execute.side_effect = None
+        assert_that(self.leader_election.elect(), equal_to(True))
+
+        assert_that(self._status(), has_entries(leader='node-1', is_leader=True))
+        assert_that(self.connect.call_count, equal_to(2))
+        self.create_engine.assert_called_once()
+        self.connection.invalidate.assert_called_once_with()
+
+    def test_connection_is_not_pooled(self):
+        self._set_leader('node-1', is_self=True)
+
+        self.leader_election.elect()
+
+        self.create_engine.assert_called_once_with(ANY, poolclass=NullPool)
+
+    def test_release(self):
+        self._set_leader('node-1', is_self=True)
+        self.leader_election.elect()
+
+        self.leader_election.release()
+
+        assert_that(self._status(), has_entries(is_leader=False))
+        self.connection.invalidate.assert_called_once_with()
+        self.connection.close.assert_called_once_with()
+
+    def test_leader_query_splits_the_lock_id(self):
+        leader_election = AdvisoryLockLeaderElection(0x123456789, 'node-1')
+        self._set_leader('node-1', is_self=True)
+
+        leader_election.elect()
+
+        self.connection.execute.assert_any_call(
+            LEADER_QUERY, classid=0x1, objid=0x23456789
+        )
+
+    def test_leader_query_with_a_negative_lock_id(self):
+        leader_election = AdvisoryLockLeaderElection(-1, 'node-1')
+        self._set_leader('node-1', is_self=True)
+
+        leader_election.elect()
+
+        self.connection.execute.assert_any_call(
+            LEADER_QUERY, classid=0xFFFFFFFF, objid=0xFFFFFFFF
+        )
+
+    def test_from_config_rejects_invalid_lock_ids(self):
+        for lock_id in (2 ** 63, -(2 ** 63) - 1, '42', None):
+            config = {'enabled': True, 'lock_id': lock_id, 'name': None}
+            assert_that(
+                calling(AdvisoryLockLeaderElection.from_config).with_args(config),
+                raises(ValueError),
+            )
+
+    def test_from_config_disabled(self):
+        config = {'enabled': False, 'lock_id': LOCK_ID, 'name': None}
+
+        assert_that(AdvisoryLockLeaderElection.from_config(config), equal_to(None))
+
+    def _set_leader(self, name, is_self):
+        result = self.connection.execute.return_value
+        result.first.return_value = Mock(is_self=is_self)
+        result.first.return_value.name = name
+
+    def _status(self):
+        status = {}
+        self.leader_election.provide_status(status)
+        return status['leader_election']
@@ -0,0 +1,110 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import assert_that, calling, equal_to, has_entries, raises
+from mock import patch
+
+from ..exceptions import TooManyLoginAttemptsException
+from ..rate_limiter import LoginRateLimiter, TokenBucketLimiter
+
+CONFIG = {
+    'enabled': True,
+    'max_keys': 10,
+    'source': {'burst': 4, 'period': 60},
+    'login': {'burst': 2, 'period': 60},
+}
+
+
+@patch('wazo_auth.rate_limiter.time.monotonic')
+class TestTokenBucketLimiter(TestCase):
+    def setUp(self):
+        self.limiter = TokenBucketLimiter(burst=3, period=30, max_keys=2)
+
+    def test_burst_then_refill(self, monotonic):
+        monotonic.return_value = 100.0
+
+        results = [self.limiter.acquire('key') for _ in range(4)]
+        assert_that(results, equal_to([True, True, True, False]))
+
+        monotonic.return_value = 109.0
+        assert_that(self.limiter.acquire('key'), equal_to(False))
+
+        monotonic.return_value = 110.0
+        assert_that(self.limiter.acquire('key'), equal_to(True))
+        assert_that(self.limiter.acquire('key'), equal_to(False))
+
+        monotonic.return_value = 1000.0
+        results = [self.limiter.acquire('key') for _ in range(4)]
+        assert_that(results, equal_to([True, True, True, False]))
+
+    def test_keys_are_independent_and_bounded(self, monotonic):
+        monotonic.return_value = 100.0
+
+        for _ in range(3):
+            self.limiter.acquire('a')
+        assert_that(self.limiter.acquire('a'), equal_to(False))
+        assert_that(self.limiter.acquire('b'), equal_to(True))
+
+        self.limiter.acquire('c')
+
+        assert_that(len(self.limiter), equal_to(2))
+        assert_that(self.limiter.acquire('a'), equal_to(True))
+
+
+@patch('wazo_auth.rate_limiter.time.monotonic', return_value=100.0)
+class TestLoginRateLimiter(TestCase):
+    def setUp(self):
+        self.limiter = LoginRateLimiter.from_config(CONFIG)
+
+    def test_check_by_login(self, _):
+        self.limiter.check('10.0.0.1', 'alice')
+        self.limiter.check('10.0.0.2', 'alice')
+
+        assert_that(
+            calling(self.limiter.check).with_args('10.0.0.3', 'alice'),
+            raises(TooManyLoginAttemptsException),
+        )
+        self.limiter.check('10.0.0.3', 'bob')
+
+        status = {}
+        self.limiter.provide_status(status)
+        assert_that(
+            status['login_rate_limiter'],
+            has_entries(
+                accepted=3,
+                rejected_by_source=0,
+                rejected_by_login=1,
+                tracked_sources=3,
+                tracked_logins=2,
+            ),
+        )
+
+    def test_check_by_source(self, _):
+        for login in ('a', 'b', 'c', None):
+            self.limiter.check('10.0.0.1', login)
+
+        assert_that(
+            calling(self.limiter.check).with_args('10.0.0.1', 'd'),
+            raises(TooManyLoginAttemptsException),
+        )
+
+        status = {}
+        self.limiter.provide_status(status)
+        assert_that(
+            status['login_rate_limiter'],
+            has_entries(accepted=4, rejected_by_source=1, tracked_logins=3),
+        )
+
+    def test_disabled(self, _):
+        limiter = LoginRateLimiter.from_config(dict(CONFIG, enabled=False))
+
+        for _ in range(10):
+            limiter.check('10.0.0.1', 'alice')
+
+        status = {}
+        limiter.provide_status(status)
+        assert_that(
+            status['login_rate_limiter'], has_entries(accepted=10, tracked_logins=0)
+        )
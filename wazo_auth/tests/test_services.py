@@ -1,14 +1,30 @@
 # Copyright 2017-2019 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from hamcrest import assert_that, contains, calling, equal_to, has_entries, not_, raises
+import threading
+import time
+
+from contextlib import contextmanager
+
+from hamcrest import (
+    assert_that,
+    contains,
+    contains_inanyorder,
+    calling,
+    equal_to,
+    has_entries,
+    not_,
+    raises,
+    starts_with,
+)
 from ..schemas import BaseSchema
 from marshmallow import fields
-from mock import Mock, patch, sentinel as s
+from mock import ANY, Mock, patch, sentinel as s
 from unittest import TestCase
 
 from wazo_auth.config import _DEFAULT_CONFIG
 from .. import exceptions, services
+from ..cache import LRUCache
 from ..database import queries
 from ..database.queries import (
     address,
@@ -55,6 +71,21 @@ class BaseServiceTestCase(TestCase):
             token=self.token_dao,
             user=self.user_dao,
         )
+        self.on_commit_callbacks = []
+
+    def patch_on_commit(self, module):
+        on_commit = patch(
+            'wazo_auth.services.{}.on_commit'.format(module),
+            side_effect=self.on_commit_callbacks.append,
+        )
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def commit(self):
+        callbacks = list(self.on_commit_callbacks)
+        del self.on_commit_callbacks[:]
+        for callback in callbacks:
+            callback()
 
 
 class TestExternalAuthService(BaseServiceTestCase):
@@ -131,7 +162,50 @@ class TestGroupService(BaseServiceTestCase):
     def setUp(self):
         super().setUp()
         self._tenant_tree = Mock()
-        self.service = services.GroupService(self.dao, self._tenant_tree)
+        self.acl_template_cache = LRUCache(10)
+        self.service = services.GroupService(
+            self.dao, self._tenant_tree, self.acl_template_cache
+        )
+        self.patch_on_commit('group')
+
+    def test_get_acl_templates_uses_the_cache(self):
+        self.user_dao.get_by_username.return_value = {'uuid': s.user_uuid}
+        self.policy_dao.list_acl_templates_of_user.return_value = {
+            'user': ['baz'],
+            'groups': ['foo.#', 'bar'],
+        }
+
+        result_1 = self.service.get_acl_templates(s.username)
+        result_2 = self.service.get_acl_templates(s.username)
+
+        assert_that(result_1, contains('foo.#', 'bar'))
+        assert_that(result_2, contains('foo.#', 'bar'))
+        self.policy_dao.list_acl_templates_of_user.assert_called_once_with(s.user_uuid)
+
+        self.service.add_policy(s.group_uuid, s.policy_uuid)
+        self.service.get_acl_templates(s.username)
+
+        self.policy_dao.list_acl_templates_of_user.assert_called_once_with(s.user_uuid)
+
+        self.commit()
+        self.service.get_acl_templates(s.username)
+
+        assert_that(self.policy_dao.list_acl_templates_of_user.call_count, equal_to(2))
+
+    def test_snapshot_version_bumped_only_when_snapshots_are_enabled(self):
+        self.service.add_user(s.group_uuid, s.user_uuid)
+
+        self.refresh_token_dao.bump_snapshot_version.assert_not_called()
+
+        service = services.GroupService(
+            self.dao,
+            self._tenant_tree,
+            self.acl_template_cache,
+            refresh_token_snapshot=True,
+        )
+        service.add_user(s.group_uuid, s.user_uuid)
+
+        self.refresh_token_dao.bump_snapshot_version.assert_called_once_with()
 
     def test_remove_policy(self):
         def when(nb_deleted, group_exists=True, policy_exists=True):
@@ -198,7 +272,24 @@ class TestPolicyService(BaseServiceTestCase):
     def setUp(self):
         super().setUp()
         self.tenant_tree = Mock()
-        self.service = services.PolicyService(self.dao, self.tenant_tree)
+        self.acl_template_cache = LRUCache(10)
+        self.service = services.PolicyService(
+            self.dao, self.tenant_tree, self.acl_template_cache
+        )
+        self.patch_on_commit('policy')
+
+    def test_update_clears_the_acl_template_cache_on_commit(self):
+        self.acl_template_cache.set(('user', s.username), ['foo.#'])
+
+        self.service.update(s.policy_uuid, name='policy')
+
+        assert_that(
+            self.acl_template_cache.get(('user', s.username)), contains('foo.#')
+        )
+
+        self.commit()
+
+        assert_that(self.acl_template_cache.get(('user', s.username)), equal_to(None))
 
     def test_delete_acl_template(self):
         def when(nb_deleted, policy_exists=True):
@@ -231,13 +322,341 @@ class TestPolicyService(BaseServiceTestCase):
             )
 
 
+class TestSessionService(BaseServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token_cache = LRUCache(10)
+        self.bus_publisher = Mock()
+        self.service = services.SessionService(
+            self.dao, Mock(), self.bus_publisher, self.token_cache
+        )
+        self.patch_on_commit('session')
+
+    def test_delete_invalidates_every_token_of_the_session(self):
+        self.token_cache.set(s.token_1, s.cached_1)
+        self.token_cache.set(s.token_2, s.cached_2)
+        self.token_cache.set(s.token_3, s.cached_3)
+        self.session_dao.delete.return_value = (
+            {'uuid': s.session_uuid, 'tenant_uuid': s.tenant_uuid},
+            [
+                {'uuid': s.token_1, 'auth_id': s.auth_id},
+                {'uuid': s.token_2, 'auth_id': s.auth_id},
+            ],
+        )
+
+        self.service.delete(s.tenant_uuid, s.session_uuid)
+
+        assert_that(self.token_cache.get(s.token_1), equal_to(s.cached_1))
+
+        self.commit()
+
+        assert_that(self.token_cache.get(s.token_1), equal_to(None))
+        assert_that(self.token_cache.get(s.token_2), equal_to(None))
+        assert_that(self.token_cache.get(s.token_3), equal_to(s.cached_3))
+        self.bus_publisher.publish.assert_called_once_with(ANY)
+
+
+class TestTenantService(BaseServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tenant_tree = Mock()
+        self.tenant_tree.is_sub_tenant.return_value = True
+        self.token_cache = LRUCache(10)
+        self.acl_template_cache = LRUCache(10)
+        self.service = services.TenantService(
+            self.dao,
+            self.tenant_tree,
+            Mock(),
+            token_cache=self.token_cache,
+            acl_template_cache=self.acl_template_cache,
+        )
+        self.patch_on_commit('tenant')
+
+    def test_new_adds_the_tenant_to_the_tree_on_commit(self):
+        self.tenant_dao.create.return_value = s.tenant_uuid
+        self.tenant_dao.list_.return_value = [
+            {'uuid': s.tenant_uuid, 'parent_uuid': s.parent_uuid}
+        ]
+
+        self.service.new(name='tenant', address={})
+
+        self.tenant_tree.add_tenant.assert_not_called()
+        self.commit()
+        self.tenant_tree.add_tenant.assert_called_once_with(
+            s.tenant_uuid, s.parent_uuid
+        )
+
+    def test_delete_removes_the_tenant_from_the_tree_on_commit(self):
+        self.service.delete(s.scoping_tenant_uuid, s.tenant_uuid)
+
+        self.tenant_tree.remove_tenant.assert_not_called()
+        self.commit()
+        self.tenant_tree.remove_tenant.assert_called_once_with(s.tenant_uuid)
+
+    def test_delete_clears_the_caches_on_commit(self):
+        self.token_cache.set(s.token_uuid, s.token)
+        self.acl_template_cache.set(('user', s.username), ['foo.#'])
+
+        self.service.delete(s.scoping_tenant_uuid, s.tenant_uuid)
+
+        assert_that(self.token_cache.get(s.token_uuid), equal_to(s.token))
+        assert_that(
+            self.acl_template_cache.get(('user', s.username)), contains('foo.#')
+        )
+
+        self.commit()
+
+        assert_that(self.token_cache.get(s.token_uuid), equal_to(None))
+        assert_that(self.acl_template_cache.get(('user', s.username)), equal_to(None))
+
+
+class TestTokenService(BaseServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token_cache = LRUCache(10)
+        self.service = services.TokenService(
+            _DEFAULT_CONFIG, self.dao, Mock(), Mock(), self.token_cache
+        )
+        self.patch_on_commit('token')
+        self.token_dao.get.side_effect = lambda uuid: {
+            'uuid': uuid,
+            'auth_id': s.auth_id,
+            'pbx_user_uuid': None,
+            'xivo_uuid': None,
+            'issued_t': time.time(),
+            'expire_t': time.time() + 120,
+            'acls': ['foo.#'],
+            'metadata': {},
+            'session_uuid': s.session_uuid,
+            'remote_addr': '',
+            'user_agent': '',
+        }
+        self.token_dao.delete.return_value = {}, {}
+        self.token_dao.create.return_value = s.token_uuid, s.session_uuid
+
+    def test_get_uses_the_cache(self):
+        token_1 = self.service.get(s.token_uuid, 'foo.bar')
+        token_2 = self.service.get(s.token_uuid, 'foo.bar')
+
+        self.token_dao.get.assert_called_once_with(s.token_uuid)
+        assert_that(token_1, equal_to(token_2))
+
+    def test_get_does_not_cache_unknown_tokens(self):
+        self.token_dao.get.side_effect = exceptions.UnknownTokenException()
+
+        assert_that(
+            calling(self.service.get).with_args(s.token_uuid, None),
+            raises(exceptions.UnknownTokenException),
+        )
+        assert_that(self.token_cache.get(s.token_uuid), equal_to(None))
+
+    def test_remove_token_invalidates_the_cache(self):
+        self.service.get(s.token_uuid, None)
+
+        self.service.remove_token(s.token_uuid)
+        self.service.get(s.token_uuid, None)
+
+        self.token_dao.get.assert_called_once_with(s.token_uuid)
+
+        self.commit()
+        self.service.get(s.token_uuid, None)
+
+        assert_that(self.token_dao.get.call_count, equal_to(2))
+
+    def test_tokens_are_scheduled_for_expiration(self):
+        timer_wheel = Mock()
+        service = services.TokenService(
+            _DEFAULT_CONFIG,
+            self.dao,
+            Mock(),
+            Mock(),
+            self.token_cache,
+            timer_wheel=timer_wheel,
+        )
+
+        token = service.get(s.token_uuid, None)
+        service.remove_token(s.token_uuid)
+
+        timer_wheel.add.assert_called_once_with(s.token_uuid, token.expire_t)
+        timer_wheel.discard.assert_called_once_with(s.token_uuid)
+
+    def test_get_many(self):
+        self.token_dao.get_many.side_effect = lambda uuids: [
+            self.token_dao.get(uuid) for uuid in uuids
+        ]
+        self.service.get(s.cached_uuid, None)
+
+        result = self.service.get_many([s.cached_uuid, s.token_uuid, s.token_uuid])
+
+        assert_that(result.keys(), contains_inanyorder(s.cached_uuid, s.token_uuid))
+        self.token_dao.get_many.assert_called_once_with([s.token_uuid])
+
+    def test_get_many_ignores_expired_tokens(self):
+        self.token_dao.get_many.return_value = [
+            dict(self.token_dao.get(s.token_uuid), expire_t=time.time() - 1)
+        ]
+
+        result = self.service.get_many([s.token_uuid])
+
+        assert_that(result, equal_to({}))
+
+    def test_new_token_reuses_an_up_to_date_snapshot(self):
+        service = self._new_snapshot_service()
+        backend = Mock()
+        metadata = {'auth_id': s.auth_id, 'uuid': s.user_uuid, 'xivo_uuid': None}
+        args = self._refresh_args(version=4, metadata=metadata, acls=['foo.#'])
+        self.refresh_token_dao.get_snapshot_version.return_value = 4
+
+        token = service.new_token(backend, s.login, args)
+
+        assert_that(token.acls, contains('foo.#'))
+        assert_that(token.metadata, equal_to(metadata))
+        backend.get_metadata.assert_not_called()
+        backend.get_acls.assert_not_called()
+        self.refresh_token_dao.update_snapshot.assert_not_called()
+
+    def test_new_token_replaces_an_outdated_snapshot(self):
+        service = self._new_snapshot_service()
+        backend = Mock()
+        metadata = {'auth_id': s.auth_id, 'uuid': s.user_uuid, 'xivo_uuid': None}
+        backend.get_metadata.return_value = metadata
+        backend.get_acls.return_value = ['bar.#']
+        args = self._refresh_args(version=3, metadata={}, acls=['foo.#'])
+        self.refresh_token_dao.get_snapshot_version.return_value = 4
+
+        token = service.new_token(backend, s.login, args)
+
+        assert_that(token.acls, contains('bar.#'))
+        self.refresh_token_dao.update_snapshot.assert_called_once_with(
+            s.refresh_token, 4, metadata, ['bar.#']
+        )
+
+    def test_new_token_without_snapshots(self):
+        backend = Mock()
+        backend.get_metadata.return_value = {'auth_id': s.auth_id, 'xivo_uuid': None}
+        args = self._refresh_args(version=4, metadata={}, acls=['foo.#'])
+
+        self.service.new_token(backend, s.login, args)
+
+        backend.get_metadata.assert_called_once_with(s.login, args)
+        self.refresh_token_dao.get_snapshot_version.assert_not_called()
+        self.refresh_token_dao.update_snapshot.assert_not_called()
+
+    def _new_snapshot_service(self):
+        config = dict(_DEFAULT_CONFIG, refresh_token_snapshot=True)
+        return services.TokenService(config, self.dao, Mock(), Mock(), self.token_cache)
+
+    def _refresh_args(self, **snapshot):
+        return {
+            'backend': s.backend,
+            'refresh_token': s.refresh_token,
+            'client_id': s.client_id,
+            'refresh_token_snapshot': snapshot,
+            'user_agent': '',
+            'remote_addr': '',
+        }
+
+
 class TestUserService(BaseServiceTestCase):
     def setUp(self):
         super().setUp()
         self.tenant_tree = Mock()
+        self.acl_template_cache = LRUCache(10)
         self.service = services.UserService(
-            self.dao, self.tenant_tree, encrypter=self.encrypter
+            self.dao,
+            self.tenant_tree,
+            encrypter=self.encrypter,
+            acl_template_cache=self.acl_template_cache,
+            user_cache=LRUCache(10),
+        )
+        self.patch_on_commit('user')
+
+    def test_get_acl_templates_uses_the_cache(self):
+        self.user_dao.get_by_username.return_value = {'uuid': s.user_uuid}
+        self.policy_dao.list_acl_templates_of_user.return_value = {
+            'user': ['foo.#'],
+            'groups': ['bar'],
+        }
+
+        self.service.get_acl_templates(s.username)
+        result = self.service.get_acl_templates(s.username)
+
+        assert_that(result, contains('foo.#'))
+        self.policy_dao.list_acl_templates_of_user.assert_called_once_with(s.user_uuid)
+
+        self.user_dao.remove_policy.return_value = 1
+        self.service.remove_policy(s.user_uuid, s.policy_uuid)
+        self.service.get_acl_templates(s.username)
+
+        self.policy_dao.list_acl_templates_of_user.assert_called_once_with(s.user_uuid)
+
+        self.commit()
+        self.service.get_acl_templates(s.username)
+
+        assert_that(self.policy_dao.list_acl_templates_of_user.call_count, equal_to(2))
+
+    def test_get_acl_templates_shares_the_login_context(self):
+        self.user_dao.get_by_username.return_value = {'uuid': s.user_uuid}
+        self.policy_dao.list_acl_templates_of_user.return_value = {
+            'user': ['foo.#'],
+            'groups': ['bar'],
+        }
+        group_service = services.GroupService(
+            self.dao, self.tenant_tree, self.acl_template_cache
         )
+        context = self.service.get_login_context(s.username, {})
+
+        user_acl_templates = self.service.get_acl_templates(s.username, context)
+        group_acl_templates = group_service.get_acl_templates(s.username, context)
+
+        assert_that(user_acl_templates, contains('foo.#'))
+        assert_that(group_acl_templates, contains('bar'))
+        self.policy_dao.list_acl_templates_of_user.assert_called_once_with(s.user_uuid)
+
+    def test_get_user_by_username_uses_the_cache(self):
+        self.user_dao.get_by_username.return_value = {'uuid': s.user_uuid}
+        self.user_dao.list_.return_value = [{'uuid': s.user_uuid}]
+
+        self.service.get_user_by_username(s.username)
+        result = self.service.get_user_by_username(s.username)
+
+        assert_that(result, has_entries(uuid=s.user_uuid))
+        self.user_dao.get_by_username.assert_called_once_with(s.username)
+
+        self.service.update(None, s.user_uuid)
+        self.service.get_user_by_username(s.username)
+
+        self.user_dao.get_by_username.assert_called_once_with(s.username)
+
+        self.commit()
+        self.service.get_user_by_username(s.username)
+
+        assert_that(self.user_dao.get_by_username.call_count, equal_to(2))
+
+    def test_get_user_by_username_unknown_user(self):
+        self.user_dao.get_by_username.side_effect = exceptions.UnknownUsernameException(
+            s.username
+        )
+
+        assert_that(
+            calling(self.service.get_user_by_username).with_args(s.username),
+            raises(exceptions.UnknownUsernameException),
+        )
+        assert_that(self.service.get_acl_templates(s.username), equal_to([]))
+
+    def test_get_login_context_is_shared_by_login(self):
+        self.user_dao.get_by_username.return_value = {'uuid': s.user_uuid}
+        args = {}
+
+        context = self.service.get_login_context(s.username, args)
+        context.user
+
+        assert_that(self.service.get_login_context(s.username, args), equal_to(context))
+        assert_that(
+            self.service.get_login_context(s.other_username, args),
+            not_(equal_to(context)),
+        )
+        self.user_dao.get_by_username.assert_called_once_with(s.username)
 
     def test_change_password(self):
         self.user_dao.list_.return_value = []
@@ -361,3 +780,150 @@ class TestUserService(BaseServiceTestCase):
 
         self.user_dao.create.assert_called_once_with(**expected_db_params)
         assert_that(result, equal_to(self.user_dao.create.return_value))
+
+    def test_verify_password_updates_the_hash_parameters(self):
+        encrypter = services.PasswordEncrypter(iterations={'internal': 1000})
+        service = services.UserService(self.dao, self.tenant_tree, encrypter=encrypter)
+        salt = b'salt'
+        legacy_hash = encrypter.compute_password_hash('s3cre7', salt)
+        self.user_dao.get_login_credentials.return_value = {
+            'uuid': s.user_uuid,
+            'purpose': 'internal',
+            'password_hash': legacy_hash,
+            'password_salt': salt,
+        }
+
+        assert_that(service.verify_password('foobar', 'wrong'), equal_to(False))
+        self.user_dao.change_password.assert_not_called()
+
+        assert_that(service.verify_password('foobar', 's3cre7'), equal_to(True))
+        self.user_dao.change_password.assert_called_once_with(s.user_uuid, ANY, ANY)
+
+        _, new_salt, new_hash = self.user_dao.change_password.call_args[0]
+        assert_that(new_hash, starts_with('pbkdf2_sha512$1000$'))
+        assert_that(encrypter.verify_password('s3cre7', new_salt, new_hash))
+        assert_that(encrypter.needs_update(new_hash, 'internal'), equal_to(False))
+
+
+class TestPasswordEncrypter(TestCase):
+    def test_legacy_hashes(self):
+        encrypter = services.PasswordEncrypter()
+        legacy_hash = encrypter.compute_password_hash('s3cre7', b'salt')
+
+        assert_that(encrypter.verify_password('s3cre7', b'salt', legacy_hash))
+        assert_that(encrypter.needs_update(legacy_hash), equal_to(False))
+
+    def test_iterations_by_purpose(self):
+        encrypter = services.PasswordEncrypter(
+            iterations={'user': 2000, 'external_api': 1000}
+        )
+
+        salt, hash_ = encrypter.encrypt_password('s3cre7', 'external_api')
+
+        assert_that(hash_, starts_with('pbkdf2_sha512$1000$'))
+        assert_that(encrypter.verify_password('s3cre7', salt, hash_))
+        assert_that(encrypter.verify_password('other', salt, hash_), equal_to(False))
+        assert_that(encrypter.needs_update(hash_, 'external_api'), equal_to(False))
+        assert_that(encrypter.needs_update(hash_, 'user'), equal_to(True))
+        assert_that(encrypter.needs_update(hash_, 'internal'), equal_to(True))
+
+
+class TestPasswordHashingExecutor(TestCase):
+    def setUp(self):
+        self.executor = services.PasswordHashingExecutor(
+            max_workers=1, max_queue_size=1
+        )
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_run(self):
+        result = self.executor.run(lambda a, b: a + b, 1, 2)
+
+        assert_that(result, equal_to(3))
+        assert_that(self._status(), has_entries(in_progress=0, completed=1, rejected=0))
+
+    def test_run_rejects_when_the_queue_is_full(self):
+        with self._occupied(self.executor, 2):
+            assert_that(
+                calling(self.executor.run).with_args(lambda: None),
+                raises(exceptions.PasswordHashingOverloadedException),
+            )
+
+        assert_that(self._status(), has_entries(in_progress=0, completed=2, rejected=1))
+
+    def test_admission_is_limited_to_half_of_the_http_threads(self):
+        executor = services.PasswordHashingExecutor(
+            max_workers=4, max_queue_size=64, max_http_threads=25
+        )
+        self.addCleanup(executor.shutdown)
+
+        assert_that(
+            self._status(executor), has_entries(max_workers=4, max_queue_size=8)
+        )
+
+    def test_run_rejects_at_half_of_the_http_threads(self):
+        executor = services.PasswordHashingExecutor(
+            max_workers=1, max_queue_size=64, max_http_threads=5
+        )
+        self.addCleanup(executor.shutdown)
+
+        with self._occupied(executor, 2):
+            assert_that(
+                calling(executor.run).with_args(lambda: None),
+                raises(exceptions.PasswordHashingOverloadedException),
+            )
+
+        assert_that(
+            self._status(executor),
+            has_entries(max_queue_size=1, completed=2, rejected=1),
+        )
+
+    def test_max_http_threads_within_the_limit(self):
+        executor = services.PasswordHashingExecutor(
+            max_workers=2, max_queue_size=2, max_http_threads=25
+        )
+        self.addCleanup(executor.shutdown)
+
+        assert_that(
+            self._status(executor), has_entries(max_workers=2, max_queue_size=2)
+        )
+
+    def test_encrypter_uses_the_executor(self):
+        encrypter = services.PasswordEncrypter(self.executor)
+        hash_ = services.PasswordEncrypter().compute_password_hash('secret', b'salt')
+
+        result = encrypter.compute_password_hash('secret', b'salt')
+
+        assert_that(result, equal_to(hash_))
+
+    @contextmanager
+    def _occupied(self, executor, nb_calls):
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        threads = [threading.Thread(target=executor.run, args=(block,))]
+        threads[0].start()
+        started.wait()
+        for _ in range(nb_calls - 1):
+            thread = threading.Thread(target=executor.run, args=(lambda: None,))
+            thread.start()
+            threads.append(thread)
+        while self._status(executor)['in_progress'] < nb_calls:
+            time.sleep(0.001)
+
+        try:
+            yield
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+
+    def _status(self, executor=None):
+        status = {}
+        (executor or self.executor).provide_status(status)
+        return status['password_hashing']
@@ -0,0 +1,62 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import assert_that, contains, contains_inanyorder, empty, equal_to
+from mock import patch
+
+from ..timer_wheel import TimerWheel
+
+
+class TestTimerWheel(TestCase):
+    def setUp(self):
+        with patch('wazo_auth.timer_wheel.time.time', return_value=1000.0):
+            self.wheel = TimerWheel(resolution=1.0, slots=4, levels=3)
+
+    def test_expire_on_time(self):
+        self.wheel.add('a', 1001.5)
+        self.wheel.add('b', 1003.0)
+
+        assert_that(self.wheel.advance(1001.9), empty())
+        assert_that(self.wheel.advance(1002.0), contains('a'))
+        assert_that(self.wheel.advance(1002.9), empty())
+        assert_that(self.wheel.advance(1003.0), contains('b'))
+        assert_that(len(self.wheel), equal_to(0))
+
+    def test_expire_from_the_upper_levels(self):
+        deadlines = {'level-1': 1010.0, 'level-2': 1040.0, 'beyond': 1500.0}
+        for key, expire_at in deadlines.items():
+            self.wheel.add(key, expire_at)
+
+        fired = {}
+        for now in range(1001, 1600):
+            for key in self.wheel.advance(now):
+                fired[key] = now
+
+        assert_that(fired, equal_to(deadlines))
+
+    def test_expire_after_a_jump(self):
+        self.wheel.add('a', 1005.0)
+        self.wheel.add('b', 1050.0)
+        self.wheel.add('c', 1100.0)
+
+        assert_that(self.wheel.advance(1060.0), contains_inanyorder('a', 'b'))
+        assert_that(self.wheel.advance(1100.0), contains('c'))
+
+    def test_already_expired_fire_on_next_tick(self):
+        self.wheel.advance(1010.0)
+
+        self.wheel.add('a', 1005.0)
+
+        assert_that(self.wheel.advance(1010.5), empty())
+        assert_that(self.wheel.advance(1011.0), contains('a'))
+
+    def test_add_again_and_discard(self):
+        self.wheel.add('a', 1030.0)
+        self.wheel.add('a', 1002.0)
+        self.wheel.add('b', 1002.0)
+        self.wheel.discard('b')
+
+        assert_that(self.wheel.advance(1002.0), contains('a'))
+        assert_that(self.wheel.advance(1100.0), empty())
@@ -5,7 +5,8 @@ import unittest
 import time
 import uuid
 
-from hamcrest import assert_that, equal_to
+from hamcrest import assert_that, equal_to, not_, same_instance
+from mock import Mock, call, patch
 
 from wazo_auth import token
 
@@ -122,6 +123,23 @@ class TestToken(unittest.TestCase):
         assert_that(self.token.matches_required_acl('foo.bar.toto.123.bar'))
         assert_that(self.token.matches_required_acl('foo.bar.toto.me.bar'))
 
+    def test_matches_required_acls_compiles_the_acls_once_per_token(self):
+        self.token.acls = ['foo.#', 'bar.*.me']
+        self.token.auth_id = '123'
+
+        with patch('wazo_auth.token.ACLMatcher', wraps=token.ACLMatcher) as ACLMatcher:
+            assert_that(self.token.matches_required_acl('bar.toto.123'))
+            assert_that(self.token.matches_required_acl('foo.bar.toto'))
+
+        ACLMatcher.assert_called_once_with(['foo.#', 'bar.*.me'], '123')
+
+    def test_matches_required_acls_when_the_acls_change(self):
+        self.token.acls = ['foo.#']
+        assert_that(self.token.matches_required_acl('foo.bar'), equal_to(True))
+
+        self.token.acls = ['bar.#']
+        assert_that(self.token.matches_required_acl('foo.bar'), equal_to(False))
+
     def test_is_expired_when_time_is_in_the_future(self):
         self.token.expire_t = time.time() + 60
 
@@ -136,3 +154,251 @@ class TestToken(unittest.TestCase):
         self.token.expire_t = None
 
         self.assertFalse(self.token.is_expired())
+
+    def test_to_dict_is_computed_once(self):
+        with patch('wazo_auth.token.datetime') as datetime:
+            result_1 = self.token.to_dict()
+            result_2 = self.token.to_dict()
+
+        assert_that(result_1, equal_to(result_2))
+        assert_that(datetime.fromtimestamp.call_count, equal_to(2))
+        assert_that(datetime.utcfromtimestamp.call_count, equal_to(2))
+
+    def test_to_dict_returns_a_copy(self):
+        result = self.token.to_dict()
+        result['acls'].append('foo.bar')
+        result['metadata']['foo'] = 'bar'
+        result['token'] = 'other'
+
+        assert_that(self.token.to_dict(), equal_to(self.token._to_dict()))
+        assert_that(self.token.to_dict()['acls'], not_(same_instance(self.token.acls)))
+
+    def test_to_dict_is_recomputed_when_the_token_changes(self):
+        self.token.to_dict()
+
+        self.token.acls = ['foo.bar']
+
+        assert_that(self.token.to_dict()['acls'], equal_to(['foo.bar']))
+
+
+@patch('wazo_auth.token.Session')
+@patch('wazo_auth.token.time.monotonic', return_value=100.0)
+class TestExpiredTokenRemover(unittest.TestCase):
+    def setUp(self):
+        config = {
+            'token_cleanup_interval': 60.0,
+            'token_cleanup_batch_size': 2,
+            'token_cleanup_max_duration': 30.0,
+            'token_expiry_timer_wheel': {'reconciliation_interval': 3600.0},
+            'debug': False,
+        }
+        self.dao = Mock()
+        self.bus_publisher = Mock()
+        self.token_cache = Mock()
+        self.remover = token.ExpiredTokenRemover(
+            config, self.dao, self.bus_publisher, self.token_cache
+        )
+
+    def test_cleanup_by_batches(self, _, Session):
+        self.dao.token.delete_expired_tokens_and_sessions.side_effect = [
+            (self._tokens('a', 'b'), []),
+            (self._tokens('c', 'd'), []),
+            (self._tokens('e'), []),
+        ]
+
+        self.remover._tokens_cleanup()
+
+        delete = self.dao.token.delete_expired_tokens_and_sessions
+        assert_that(
+            delete.call_args_list, equal_to([call(limit=2, token_uuids=None)] * 3)
+        )
+        assert_that(Session.commit.call_count, equal_to(3))
+        self.token_cache.pop.assert_has_calls([call(uuid) for uuid in 'abcde'])
+
+    def test_cleanup_stops_after_max_duration(self, monotonic, _):
+        monotonic.side_effect = [100.0, 120.0, 130.0]
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = (
+            self._tokens('a', 'b'),
+            [],
+        )
+
+        self.remover._tokens_cleanup()
+
+        delete = self.dao.token.delete_expired_tokens_and_sessions
+        assert_that(delete.call_count, equal_to(2))
+
+    def test_cleanup_stops_on_error(self, _, Session):
+        self.dao.token.delete_expired_tokens_and_sessions.side_effect = Exception
+
+        self.remover._tokens_cleanup()
+
+        Session.rollback.assert_called_once_with()
+        self.token_cache.pop.assert_not_called()
+
+    @patch('wazo_auth.token.SessionDeletedEvent')
+    def test_orphan_sessions_cleanup(self, SessionDeletedEvent, _, Session):
+        self.dao.token.delete_orphan_sessions.side_effect = [
+            self._orphan_sessions('a', 'b'),
+            self._orphan_sessions('c'),
+        ]
+
+        self.remover._orphan_sessions_cleanup()
+
+        delete = self.dao.token.delete_orphan_sessions
+        assert_that(delete.call_args_list, equal_to([call(limit=2)] * 2))
+        assert_that(Session.commit.call_count, equal_to(2))
+        assert_that(
+            SessionDeletedEvent.call_args_list,
+            equal_to(
+                [
+                    call(
+                        uuid=uuid, user_uuid=None, tenant_uuid='tenant-{}'.format(uuid)
+                    )
+                    for uuid in 'abc'
+                ]
+            ),
+        )
+        assert_that(self.bus_publisher.publish.call_count, equal_to(3))
+
+    def test_orphan_sessions_cleanup_stops_on_error(self, _, Session):
+        self.dao.token.delete_orphan_sessions.side_effect = Exception
+
+        self.remover._orphan_sessions_cleanup()
+
+        Session.rollback.assert_called_once_with()
+        self.bus_publisher.publish.assert_not_called()
+
+    def test_leader_cleans_up_orphan_sessions(self, *_):
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = [], []
+        self.dao.token.delete_orphan_sessions.return_value = []
+        self.dao.token.get_tokens_and_session_that_expire_soon.return_value = [], []
+        tombstone = self.remover._tombstone
+        tombstone.wait = Mock(side_effect=lambda timeout: tombstone.set())
+
+        self.remover._loop()
+
+        self.dao.token.delete_orphan_sessions.assert_called_once_with(limit=2)
+
+    def test_scheduled_cleanup(self, *_):
+        timer_wheel = Mock()
+        timer_wheel.advance.return_value = ['a', 'b', 'c']
+        self.remover._timer_wheel = timer_wheel
+        self.dao.token.delete_expired_tokens_and_sessions.side_effect = [
+            (self._tokens('a', 'b'), []),
+            (self._tokens('c'), []),
+        ]
+
+        self.remover._scheduled_tokens_cleanup()
+
+        delete = self.dao.token.delete_expired_tokens_and_sessions
+        assert_that(
+            delete.call_args_list,
+            equal_to(
+                [
+                    call(limit=2, token_uuids=['a', 'b']),
+                    call(limit=2, token_uuids=['c']),
+                ]
+            ),
+        )
+        timer_wheel.discard.assert_has_calls([call('a'), call('b'), call('c')])
+        timer_wheel.add.assert_not_called()
+
+    @patch('wazo_auth.token.time.time', return_value=1000.0)
+    def test_scheduled_cleanup_retries_on_error(self, *_):
+        timer_wheel = Mock()
+        timer_wheel.advance.return_value = ['a', 'b']
+        self.remover._timer_wheel = timer_wheel
+        self.dao.token.delete_expired_tokens_and_sessions.side_effect = Exception
+
+        self.remover._scheduled_tokens_cleanup()
+
+        retry_at = 1000.0 + token.SCHEDULED_CLEANUP_RETRY_DELAY
+        assert_that(
+            timer_wheel.add.call_args_list,
+            equal_to([call('a', retry_at), call('b', retry_at)]),
+        )
+
+    @patch('wazo_auth.token.time.time', return_value=1000.0)
+    def test_scheduled_cleanup_retries_remaining_tokens_once(self, *_):
+        timer_wheel = Mock()
+        timer_wheel.advance.return_value = ['a', 'b']
+        self.remover._timer_wheel = timer_wheel
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = (
+            self._tokens('a'),
+            [],
+        )
+
+        self.remover._scheduled_tokens_cleanup()
+
+        retry_at = 1000.0 + token.SCHEDULED_CLEANUP_RETRY_DELAY
+        timer_wheel.add.assert_called_once_with('b', retry_at)
+
+        timer_wheel.add.reset_mock()
+        timer_wheel.advance.return_value = ['b']
+        self.dao.token.delete_expired_tokens_and_sessions.return_value = [], []
+
+        self.remover._scheduled_tokens_cleanup()
+
+        timer_wheel.add.assert_not_called()
+
+    def test_only_the_leader_cleans_up(self, *_):
+        leader_election = Mock()
+        leader_election.elect.return_value = False
+        self.remover._leader_election = leader_election
+        tombstone = self.remover._tombstone
+        tombstone.wait = Mock(side_effect=lambda timeout: tombstone.set())
+
+        self.remover._loop()
+
+        leader_election.elect.assert_called_once_with()
+        self.dao.token.delete_expired_tokens_and_sessions.assert_not_called()
+        self.dao.token.delete_orphan_sessions.assert_not_called()
+        self.dao.token.get_tokens_and_session_that_expire_soon.assert_not_called()
+
+    @patch('wazo_auth.token.SessionExpireSoonEvent')
+    def test_notice_each_session_once(self, SessionExpireSoonEvent, *_):
+        expire_soon = self.dao.token.get_tokens_and_session_that_expire_soon
+        expire_soon.side_effect = [
+            (self._tokens('a', 'b'), self._sessions('a', 'b')),
+            (self._tokens('a', 'b', 'c'), self._sessions('a', 'b', 'c')),
+            (self._tokens('c'), self._sessions('c')),
+            (self._tokens('a'), self._sessions('a')),
+        ]
+
+        for _ in range(4):
+            self.remover._tokens_notice()
+
+        assert_that(
+            SessionExpireSoonEvent.call_args_list,
+            equal_to(
+                [
+                    call(uuid='a', user_uuid='user-a', tenant_uuid='tenant-a'),
+                    call(uuid='b', user_uuid='user-b', tenant_uuid='tenant-b'),
+                    call(uuid='c', user_uuid='user-c', tenant_uuid='tenant-c'),
+                    call(uuid='a', user_uuid='user-a', tenant_uuid='tenant-a'),
+                ]
+            ),
+        )
+        assert_that(self.bus_publisher.publish.call_count, equal_to(4))
+
+    @staticmethod
+    def _tokens(*uuids):
+        return [
+            {
+                'uuid': uuid,
+                'auth_id': 'user-{}'.format(uuid),
+                'session_uuid': uuid,
+                'tenant_uuid': 'tenant-{}'.format(uuid),
+            }
+            for uuid in uuids
+        ]
+
+    @staticmethod
+    def _sessions(*uuids):
+        return [{'uuid': uuid} for uuid in uuids]
+
+    @staticmethod
+    def _orphan_sessions(*uuids):
+        return [
+            {'uuid': uuid, 'tenant_uuid': 'tenant-{}'.format(uuid)} for uuid in uuids
+        ]
@@ -0,0 +1,105 @@
+# Copyright 2020 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import math
+import threading
+import time
+
+
+class TimerWheel:
+    """Hierarchical timer wheel
+
+    Each level has `slots` slots, a slot of level 0 covers `resolution` seconds and
+    a slot of level N covers a whole turn of level N - 1. Keys are added in the
+    lowest level that can hold their deadline and move down a level each time the
+    wheel reaches their slot, until they expire from level 0.
+    """
+
+    def __init__(self, resolution=1.0, slots=64, levels=4):
+        self.resolution = resolution
+        self._slots = slots
+        self._levels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._deadlines = {}
+        self._current_tick = math.floor(time.time() / resolution)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def add(self, key, expire_at):
+        tick = math.ceil(expire_at / self.resolution)
+        with self._lock:
+            if self._deadlines.get(key) == tick:
+                return
+            self._deadlines[key] = tick
+            self._insert(key, tick)
+
+    def discard(self, key):
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def advance(self, now):
+        target_tick = math.floor(now / self.resolution)
+        expired = []
+        with self._lock:
+            while self._current_tick < target_tick and self._deadlines:
+                self._current_tick += 1
+                self._cascade()
+                expired.extend(self._expire())
+            self._current_tick = max(self._current_tick, target_tick)
+
+        return expired
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['resolution'], config['slots'], config['levels'])
+
+    def _insert(self, key, tick):
+        # Keys that are already due fire on the next tick
+        tick = max(tick, self._current_tick + 1)
+        delta = tick - self._current_tick
+        for level, slots in enumerate(self._levels):
+            if delta < self._slots ** (level + 1) or level == len(self._levels) - 1:
+                # Deadlines beyond the last level are kept in its farthest slot
+                # and inserted again when the wheel reaches it
+                level_tick = min(
+                    tick, self._current_tick + self._slots ** (level + 1) - 1
+                )
+                index = (level_tick // self._slots ** level) % self._slots
+                slots[index].add(key)
+                return
+
+    def _cascade(self):
+        for level in range(len(self._levels) - 1, 0, -1):
+            span = self._slots ** level
+            if self._current_tick % span:
+                continue
+
+            index = (self._current_tick // span) % self._slots
+            keys = self._levels[level][index]
+            self._levels[level][index] = set()
+            for key in keys:
+                tick = self._deadlines.get(key)
+                if tick is None:
+                    continue
+                if tick <= self._current_tick:
+                    self._levels[0][self._current_tick % self._slots].add(key)
+                else:
+                    self._insert(key, tick)
+
+    def _expire(self):
+        index = self._current_tick % self._slots
+        keys = self._levels[0][index]
+        self._levels[0][index] = set()
+
+        expired = []
+        for key in keys:
+            tick = self._deadlines.get(key)
+            if tick is None:
+                continue
+            if tick <= self._current_tick:
+                del self._deadlines[key]
+                expired.append(key)
+            else:
+                self._insert(key, tick)
+        return expired
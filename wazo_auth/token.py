@@ -16,9 +16,61 @@ from wazo_auth.database.helpers import Session
 logger = logging.getLogger(__name__)
 
 DEFAULT_XIVO_UUID = os.getenv('XIVO_UUID')
+SCHEDULED_CLEANUP_RETRY_DELAY = 5.0
+
+
+class ACLMatcher:
+    def __init__(self, acls, auth_id):
+        self._regex = self._compile(acls, auth_id)
+
+    def matches(self, required_acl):
+        if not self._regex:
+            return False
+        return self._regex.match(required_acl) is not None
+
+    @classmethod
+    def _compile(cls, acls, auth_id):
+        if not acls:
+            return None
+
+        acl_regexes = (cls._transform_acl_to_regex(acl, auth_id) for acl in acls)
+        return re.compile('^(?:{})$'.format('|'.join(acl_regexes)))
+
+    @classmethod
+    def _transform_acl_to_regex(cls, acl, auth_id):
+        acl_regex = re.escape(acl).replace('\\*', '[^.]*?').replace('\\#', '.*?')
+        return cls._transform_acl_me_to_uuid_or_me(acl_regex, auth_id)
+
+    @staticmethod
+    def _transform_acl_me_to_uuid_or_me(acl_regex, auth_id):
+        me_regex = '(?:me|{auth_id})'.format(auth_id=re.escape(str(auth_id)))
+        acl_regex = acl_regex.replace('\\.me\\.', '\\.{}\\.'.format(me_regex))
+        if acl_regex.endswith('\\.me'):
+            acl_regex = '{acl_start}\\.{me}'.format(
+                acl_start=acl_regex[:-4], me=me_regex
+            )
+        return acl_regex
 
 
 class Token:
+
+    __slots__ = (
+        'token',
+        'auth_id',
+        'pbx_user_uuid',
+        'xivo_uuid',
+        'issued_t',
+        'expire_t',
+        'acls',
+        'metadata',
+        'session_uuid',
+        'user_agent',
+        'remote_addr',
+        'refresh_token',
+        '_dict',
+        '_acl_matcher',
+    )
+
     def __init__(
         self,
         id_,
@@ -65,6 +117,12 @@ class Token:
     def __ne__(self, other):
         return not self == other
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            super().__setattr__('_dict', None)
+            super().__setattr__('_acl_matcher', None)
+
     @staticmethod
     def _format_local_time(t):
         if not t:
@@ -78,6 +136,18 @@ class Token:
         return datetime.utcfromtimestamp(t).isoformat()
 
     def to_dict(self):
+        if self._dict is None:
+            self._dict = self._to_dict()
+        # NOTE: the token is shared by the requests through the token cache, only
+        # give copies of the memoized dict and of its mutable fields
+        result = dict(self._dict)
+        if result['acls'] is not None:
+            result['acls'] = list(result['acls'])
+        if result['metadata'] is not None:
+            result['metadata'] = dict(result['metadata'])
+        return result
+
+    def _to_dict(self):
         result = {
             'token': self.token,
             'auth_id': self.auth_id,
@@ -104,37 +174,42 @@ class Token:
         if required_acl is None:
             return True
 
-        for user_acl in self.acls:
-            user_acl_regex = self._transform_acl_to_regex(user_acl)
-            if re.match(user_acl_regex, required_acl):
-                return True
-        return False
+        return self._get_acl_matcher().matches(required_acl)
 
-    def _transform_acl_to_regex(self, acl):
-        acl_regex = re.escape(acl).replace('\\*', '[^.]*?').replace('\\#', '.*?')
-        acl_regex = self._transform_acl_me_to_uuid_or_me(acl_regex)
-        return re.compile('^{}$'.format(acl_regex))
-
-    def _transform_acl_me_to_uuid_or_me(self, acl_regex):
-        acl_regex = acl_regex.replace(
-            '\\.me\\.', '\\.(me|{auth_id})\\.'.format(auth_id=self.auth_id)
-        )
-        if acl_regex.endswith('\\.me'):
-            acl_regex = '{acl_start}\\.(me|{auth_id})'.format(
-                acl_start=acl_regex[:-4], auth_id=self.auth_id
-            )
-        return acl_regex
+    def _get_acl_matcher(self):
+        if self._acl_matcher is None:
+            self._acl_matcher = ACLMatcher(self.acls, self.auth_id)
+        return self._acl_matcher
 
 
 class ExpiredTokenRemover:
-    def __init__(self, config, dao, bus_publisher):
+    def __init__(
+        self,
+        config,
+        dao,
+        bus_publisher,
+        token_cache,
+        timer_wheel=None,
+        leader_election=None,
+    ):
         self._dao = dao
         self._bus_publisher = bus_publisher
+        self._token_cache = token_cache
+        self._timer_wheel = timer_wheel
+        self._leader_election = leader_election
         self._cleanup_interval = config['token_cleanup_interval']
+        self._cleanup_batch_size = config['token_cleanup_batch_size']
+        self._cleanup_max_duration = config['token_cleanup_max_duration']
+        self._reconciliation_interval = config['token_expiry_timer_wheel'][
+            'reconciliation_interval'
+        ]
+        self._notified_sessions = set()
+        self._retried_tokens = set()
         self._debug = config['debug']
 
         self._tombstone = threading.Event()
-        self._thread = threading.Thread(target=self._loop)
+        loop = self._loop if timer_wheel is None else self._timer_wheel_loop
+        self._thread = threading.Thread(target=loop)
         self._thread.daemon = True
 
     def start(self):
@@ -144,13 +219,22 @@ class ExpiredTokenRemover:
         self._tombstone.set()
         self._thread.join()
         self._tombstone.clear()
+        if self._leader_election is not None:
+            self._leader_election.release()
+
+    def _is_leader(self):
+        if self._leader_election is None:
+            return True
+        return self._leader_election.elect()
 
     def _loop(self):
         while not self._tombstone.is_set():
             started = time.monotonic()
 
-            self._tokens_cleanup()
-            self._tokens_notice()
+            if self._is_leader():
+                self._tokens_cleanup()
+                self._orphan_sessions_cleanup()
+                self._tokens_notice()
 
             elapsed = time.monotonic() - started
 
@@ -163,20 +247,124 @@ class ExpiredTokenRemover:
             if elapsed < self._cleanup_interval:
                 self._tombstone.wait(self._cleanup_interval - elapsed)
 
+    def _timer_wheel_loop(self):
+        next_reconciliation = next_notice = time.monotonic()
+        while not self._tombstone.is_set():
+            now = time.monotonic()
+            if now >= next_notice:
+                next_notice = now + self._cleanup_interval
+                if self._is_leader():
+                    if now >= next_reconciliation:
+                        self._tokens_cleanup()
+                        self._orphan_sessions_cleanup()
+                        self._retried_tokens.clear()
+                        next_reconciliation = now + self._reconciliation_interval
+                    self._tokens_notice()
+
+            # Each node deletes its own scheduled tokens, DELETE ... RETURNING
+            # only returns a token to the node that deleted it
+            self._scheduled_tokens_cleanup()
+            self._tombstone.wait(self._timer_wheel.resolution)
+
+    def _scheduled_tokens_cleanup(self):
+        now = time.time()
+        token_uuids = self._timer_wheel.advance(now)
+        for i in range(0, len(token_uuids), self._cleanup_batch_size):
+            batch = token_uuids[i : i + self._cleanup_batch_size]
+            tokens = self._tokens_cleanup_batch(token_uuids=batch)
+            self._reschedule_remaining_tokens(batch, tokens, now)
+
+    def _reschedule_remaining_tokens(self, token_uuids, tokens, now):
+        # NOTE: tokens that could not be deleted are retried shortly instead of waiting
+        # for the reconciliation. A token that was not returned may already have been
+        # deleted by another node, it is only retried once.
+        if tokens is None:
+            remaining = token_uuids
+        else:
+            deleted = {token['uuid'] for token in tokens}
+            remaining = []
+            for token_uuid in token_uuids:
+                if token_uuid in deleted or token_uuid in self._retried_tokens:
+                    self._retried_tokens.discard(token_uuid)
+                    continue
+                self._retried_tokens.add(token_uuid)
+                remaining.append(token_uuid)
+
+        for token_uuid in remaining:
+            self._timer_wheel.add(token_uuid, now + SCHEDULED_CLEANUP_RETRY_DELAY)
+
     def _tokens_cleanup(self):
+        deadline = time.monotonic() + self._cleanup_max_duration
+        while not self._tombstone.is_set():
+            tokens = self._tokens_cleanup_batch()
+            if tokens is None or len(tokens) < self._cleanup_batch_size:
+                return
+
+            if time.monotonic() >= deadline:
+                logger.info(
+                    'expired tokens cleanup interrupted after %s seconds',
+                    self._cleanup_max_duration,
+                )
+                return
+
+    def _tokens_cleanup_batch(self, token_uuids=None):
         try:
-            tokens, sessions = self._dao.token.delete_expired_tokens_and_sessions()
+            tokens, sessions = self._dao.token.delete_expired_tokens_and_sessions(
+                limit=self._cleanup_batch_size, token_uuids=token_uuids
+            )
             Session.commit()
         except Exception:
             Session.rollback()
             logger.warning(
                 'failed to remove expired tokens and sessions', exc_info=self._debug
             )
-            return
+            return None
         finally:
             Session.close()
 
+        for token in tokens:
+            self._token_cache.pop(token['uuid'])
+            if self._timer_wheel is not None:
+                self._timer_wheel.discard(token['uuid'])
         self._publish_event(tokens, sessions, SessionDeletedEvent)
+        return tokens
+
+    def _orphan_sessions_cleanup(self):
+        # NOTE: a session whose last tokens are deleted concurrently is left without
+        # any token, it is only removed here
+        deadline = time.monotonic() + self._cleanup_max_duration
+        while not self._tombstone.is_set():
+            try:
+                sessions = self._dao.token.delete_orphan_sessions(
+                    limit=self._cleanup_batch_size
+                )
+                Session.commit()
+            except Exception:
+                Session.rollback()
+                logger.warning(
+                    'failed to remove sessions without token', exc_info=self._debug
+                )
+                return
+            finally:
+                Session.close()
+
+            for session in sessions:
+                event = SessionDeletedEvent(
+                    uuid=session['uuid'],
+                    user_uuid=None,
+                    tenant_uuid=session['tenant_uuid'],
+                )
+                self._bus_publisher.publish(event)
+
+            if len(sessions) < self._cleanup_batch_size:
+                return
+
+            if time.monotonic() >= deadline:
+                logger.info(
+                    'sessions without token cleanup interrupted after %s seconds',
+                    self._cleanup_max_duration,
+                )
+                return
 
     def _tokens_notice(self):
         try:
@@ -190,20 +378,27 @@ class ExpiredTokenRemover:
             )
             return
 
+        # The sessions expiring soon stay in that window until they are deleted,
+        # the ones that were already in it on the last run have been notified
+        notified_sessions = self._notified_sessions
+        self._notified_sessions = {session['uuid'] for session in sessions}
+        sessions = [
+            session for session in sessions if session['uuid'] not in notified_sessions
+        ]
         self._publish_event(tokens, sessions, SessionExpireSoonEvent)
 
     def _publish_event(self, tokens, sessions, event_class):
+        tokens_by_session = {token['session_uuid']: token for token in tokens}
         for session in sessions:
             event_args = {
                 'uuid': session['uuid'],
                 'user_uuid': None,
                 'tenant_uuid': None,
             }
-            for token in tokens:
-                if token['session_uuid'] == session['uuid']:
-                    event_args['user_uuid'] = token['auth_id']
-                    event_args['tenant_uuid'] = token['metadata'].get('tenant_uuid')
-                    break
+            token = tokens_by_session.get(session['uuid'])
+            if token:
+                event_args['user_uuid'] = token['auth_id']
+                event_args['tenant_uuid'] = token['tenant_uuid']
             else:
                 logger.warning(
                     'session without token associated: {}'.format(session['uuid'])